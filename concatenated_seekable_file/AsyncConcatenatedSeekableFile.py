@@ -1,14 +1,33 @@
 import asyncio
 import inspect
 import io
+import operator
 import os
-from typing import Callable, Optional, Awaitable, TypeVar, Union, Tuple, List
+import weakref
+from collections import OrderedDict
+from typing import Callable, Optional, Awaitable, TypeVar, Union, Tuple, List, Dict, AsyncIterator, Iterable, \
+    Sequence
 
 import asyncio_rlock
 from asynciobase import AsyncIOBase
 
+from .BlockCache import BlockCache
+from .LazyMember import LazyMember, Opener
+from .Manifest import ManifestMembers, read_manifest, write_manifest
+from .OffsetIndex import OffsetIndex
+from .helpers import LINE_CHUNK_SIZE, fmmap, munmap, np, preadinto, record_dtype, strided
+
 T = TypeVar('T')
 
+# initial readahead window, doubled on every sequential refill up to the configured size
+READAHEAD_MIN = 64 * 1024
+# how much of the upcoming members is fetched in background
+PREFETCH_SIZE = 64 * 1024
+# size of member blocks kept in the block cache, smaller caches use blocks of their own size
+CACHE_BLOCK_SIZE = 64 * 1024
+# ranges of `read_many()` closer than that are read together
+READ_MANY_GAP = 4 * 1024
+
 
 # noinspection SpellCheckingInspection
 async def _acall(f: Callable[..., Union[Awaitable[T], T]], *args, **kwargs) -> T:
@@ -58,16 +77,49 @@ async def _flen(f: io.IOBase) -> Optional[int]:
     return None
 
 
+# noinspection SpellCheckingInspection
+async def _ffileno(f: io.IOBase) -> Optional[int]:
+    # descriptor of real binary files, used for positional reads
+    if not hasattr(os, 'pread') or not hasattr(f, 'fileno'):
+        return None
+
+    try:
+        fileno = await _acall(f.fileno)
+    except OSError:
+        return None
+
+    if hasattr(f, 'mode') and 'b' not in f.mode:
+        return None
+
+    return fileno
+
+
 class AsyncConcatenatedSeekableFile(AsyncIOBase):
     async def __aenter__(self):
         async with self._lock:
             if not self.__inited:
-                self.lengths = await self._call_on_all_files(_flen)
+                if isinstance(self.files, ManifestMembers):
+                    # members and index come from manifest, there's nothing to probe
+                    self._readable = self._seekable = True
+                    self._closed = False
+                    self.__inited = True
+                    return self
+
+                if self._given_lengths is not None:
+                    # trust the caller, members are not probed
+                    lengths = self._given_lengths
+                    if len(lengths) != len(self.files):
+                        raise ValueError(f'{len(lengths)} lengths given for {len(self.files)} files.')
+                else:
+                    lengths = await asyncio.gather(*(self._probe_length(i) for i in range(len(self.files))))
 
-                for i in range(len(self.lengths)):
-                    if self.lengths[i] is None:
+                for i in range(len(lengths)):
+                    if lengths[i] is None:
                         raise ValueError(f'{self.files[i]} ({i}) has unknown length.')
 
+                self.lengths = lengths
+                await self.refresh_capabilities()
+
                 self._closed = False
                 self.__inited = True
             return self
@@ -76,9 +128,39 @@ class AsyncConcatenatedSeekableFile(AsyncIOBase):
         async with self._lock:
             await self.close()
 
-    def __init__(self, *files: Tuple[io.IOBase], name: str = ''):
+    def __init__(self, *files: Union[io.IOBase, LazyMember, Opener], name: str = '', concurrency: int = 1,
+                 readahead: int = 0, prefetch: int = 0, cache_size: int = 0, max_open: int = 0,
+                 lengths: Optional[Sequence[int]] = None, verify_lengths: bool = False,
+                 segment_size: Optional[int] = None, use_mmap: bool = True):
         # SHOULD BE CREATED USING ASYNC CONTEXT MANAGER OR `create()` METHOD
+        # paths and `LazyMember`s are opened on first access, `max_open` > 0 caps how many of them stay open
+        # `lengths` of members skip probing them, `verify_lengths` checks each one when its member is first touched
+        # `segment_size` declares that every member but the last is that long, it's detected when not given
+        # `concurrency` > 1 issues reads spanning multiple members concurrently, up to that many at once
+        # `readahead` > 0 buffers cursor reads, growing the window up to that many bytes while reading sequentially
+        # `prefetch` > 0 fetches beginnings of that many upcoming members in background while reading a member
+        # `cache_size` > 0 keeps up to that many bytes of recently read member blocks in memory
+        # `use_mmap` maps members that are real files into memory, reads inside of them are not copied
+        #  and bypass block cache
         self.__inited = False
+        self._concurrency = concurrency
+        self._given_lengths = lengths
+        self._segment_size = segment_size
+        self._verify_lengths = verify_lengths
+        self._verified = set()
+        self.cache = BlockCache(cache_size) if cache_size else None
+        # blocks never larger than the whole cache, so that they fit in it
+        self._cache_block_size = min(CACHE_BLOCK_SIZE, cache_size) if cache_size else CACHE_BLOCK_SIZE
+
+        self._prefetch = prefetch
+        self._prefetch_tasks: Dict[int, asyncio.Future] = {}
+
+        self._readahead = readahead
+        self._readahead_window = min(READAHEAD_MIN, readahead)
+        self._readahead_buf = b''
+        self._readahead_offset = 0
+        self.readahead_hits = 0
+        self.readahead_misses = 0
 
         self._lock = asyncio_rlock.RLock()
         self._pos = 0
@@ -87,34 +169,456 @@ class AsyncConcatenatedSeekableFile(AsyncIOBase):
         self._closed = True
         self._name = name
 
-        self.files = files
+        # last known position of every touched member, lets sequential reads skip seeking
+        self._member_pos: Dict[int, int] = {}
+        # number of seeks issued on members
+        self.member_seeks = 0
+        # serializes seek + read pairs on members shared by cursor and positional reads,
+        # locks nobody holds or waits for are dropped
+        self._member_locks: 'weakref.WeakValueDictionary[int, asyncio.Lock]' = weakref.WeakValueDictionary()
+        # descriptors of members that are real files
+        self._filenos: Dict[int, int] = {}
+        # (mtime in nanoseconds, inode) of real file members taken with their lengths, see `save_manifest()`
+        self._stats: Dict[int, Tuple[int, int]] = {}
+        # read-only mappings of real file members
+        self._use_mmap = use_mmap
+        self._maps: Dict[int, memoryview] = {}
+
+        # opened lazy members, least recently used first
+        self._open: 'OrderedDict[int, io.IOBase]' = OrderedDict()
+        self._max_open = max_open
+
+        # member capabilities probed once, see `refresh_capabilities()`
+        # one byte per member
+        self._members_readable = b''
+        self._members_seekable = b''
+        self._readable = False
+        self._seekable = False
+
+        self.files = tuple(LazyMember(f) if isinstance(f, (str, os.PathLike)) else f for f in files)
+        self._index = None
+        self._length = 0
         self.lengths = None
 
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        # lines from the file position, read in big chunks and scanned for newlines,
+        # file position follows yielded lines
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._seekable:
+            # positional reads need seekable members
+            return super().__aiter__()
+        return self._lines()
+
+    async def _lines(self) -> AsyncIterator[bytes]:
+        # parts of the current line from previous chunks
+        pending = []
+        chunk = b''
+        chunk_pos = 0
+        read_pos = self._pos
+        while True:
+            newline = chunk.find(b'\n', chunk_pos)
+            if newline < 0:
+                if chunk_pos < len(chunk):
+                    pending.append(chunk[chunk_pos:])
+
+                chunk = await self.read_at(read_pos, LINE_CHUNK_SIZE)
+                chunk_pos = 0
+                read_pos += len(chunk)
+
+                # detect eof
+                if not chunk:
+                    if pending:
+                        line = b''.join(pending)
+                        async with self._lock:
+                            self._set_pos(self._pos + len(line))
+                        yield line
+                    return
+                continue
+
+            line = chunk[chunk_pos:newline + 1]
+            if pending:
+                line = b''.join(pending) + line
+                pending = []
+            chunk_pos = newline + 1
+
+            async with self._lock:
+                pos = self._pos + len(line)
+                self._set_pos(pos)
+            yield line
+
+            if self._pos != pos:
+                # file position was moved in the meantime, continue from there
+                pending = []
+                chunk = b''
+                chunk_pos = 0
+                read_pos = self._pos
+
+    def __getitem__(self, key: Union[int, slice]) -> Awaitable[Union[int, bytes, memoryview]]:
+        # awaitable byte value or data of a slice, see `getrange()`
+        return self._getitem(key)
+
+    async def _getitem(self, key: Union[int, slice]) -> Union[int, bytes, memoryview]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return await self.getrange(start, stop)
+
+            r = range(start, stop, step)
+            if not r:
+                return b''
+            start = min(r[0], r[-1])
+            return strided(await self.getrange(start, max(r[0], r[-1]) + 1), start, r)
+
+        key = operator.index(key)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('index out of range')
+        return (await self.getrange(key, key + 1))[0]
+
     def __len__(self) -> int:
-        return sum(self.lengths)
+        return self._length
+
+    @property
+    def lengths(self) -> Optional[Sequence[int]]:
+        return self._index.lengths if self._index is not None else None
+
+    @lengths.setter
+    def lengths(self, lengths: Optional[Sequence[int]]):
+        # offset index and total length are rebuilt only when member lengths change
+        self._set_index(OffsetIndex(lengths, self._segment_size) if lengths is not None else None)
+
+    def _set_index(self, index: Optional[OffsetIndex]):
+        self._index = index
+        self._length = len(index) if index is not None else 0
 
     async def _call_on_all_files(self, f: Callable[[io.IOBase], Union[T, Awaitable[T]]]) -> Tuple[T, ...]:
         return await asyncio.gather(*(_acall(f, file) for file in self.files))
 
+    async def _probe_length(self, index: int) -> Optional[int]:
+        f = self.files[index]
+        if not isinstance(f, LazyMember):
+            return await self._probe_file_length(index, f)
+
+        if f.length is not None:
+            return f.length
+        elif not callable(f.opener):
+            stat = os.stat(f.opener)
+            self._stats[index] = (stat.st_mtime_ns, stat.st_ino)
+            return stat.st_size
+
+        async with self._member_lock(index):
+            return await self._probe_file_length(index, await self._member(index))
+
+    async def _probe_file_length(self, index: int, f: io.IOBase) -> Optional[int]:
+        fileno = await _ffileno(f)
+        if fileno is not None:
+            # taken first, so a change made while probing makes the member look modified, not the other way around
+            stat = os.fstat(fileno)
+            self._stats[index] = (stat.st_mtime_ns, stat.st_ino)
+        return await _flen(f)
+
+    async def _member(self, index: int) -> io.IOBase:
+        # file object of member, opens lazy members and keeps at most `max_open` of them open
+        # SHOULD BE CALLED WITH MEMBER LOCK HELD
+        f = self.files[index]
+        if not isinstance(f, LazyMember):
+            await self._verify_length(index, f)
+            return f
+
+        handle = self._open.get(index)
+        if handle is not None:
+            self._open.move_to_end(index)
+            return handle
+
+        handle = self._open[index] = await f.open()
+        fileno = await _ffileno(handle)
+        if fileno is not None:
+            self._filenos[index] = fileno
+            view = fmmap(fileno) if self._use_mmap else None
+            if view is not None:
+                self._maps[index] = view
+        await self._verify_length(index, handle)
+
+        if self._max_open:
+            for evicted in list(self._open):
+                if len(self._open) <= self._max_open:
+                    break
+
+                # members in use are not closed under the reader
+                if self._member_lock(evicted).locked():
+                    continue
+
+                await self._close_member(evicted)
+
+        return handle
+
+    async def _verify_length(self, index: int, f: io.IOBase):
+        if not self._verify_lengths or self.lengths is None or index in self._verified:
+            return
+
+        length = await _flen(f)
+        if length != self.lengths[index]:
+            raise ValueError(f'{self.files[index]} ({index}) has length {length}, expected {self.lengths[index]}.')
+        self._verified.add(index)
+
+    async def _close_member(self, index: int):
+        handle = self._open.pop(index, None)
+        if handle is not None:
+            self._filenos.pop(index, None)
+            view = self._maps.pop(index, None)
+            if view is not None:
+                munmap(view)
+            self._member_pos.pop(index, None)
+            # member could be changed before it's opened again
+            self._verified.discard(index)
+            await _acall(handle.close)
+
+    def _member_fileno(self, index: int) -> Optional[int]:
+        if self._verify_lengths and index not in self._verified:
+            # let the member be verified first
+            return None
+
+        fileno = self._filenos.get(index)
+        if fileno is not None and index in self._open:
+            self._open.move_to_end(index)
+        return fileno
+
+    def _member_map(self, index: int) -> Optional[memoryview]:
+        if self._verify_lengths and index not in self._verified:
+            # let the member be verified first
+            return None
+
+        view = self._maps.get(index)
+        if view is not None and index in self._open:
+            self._open.move_to_end(index)
+        return view
+
     async def _recalc_file(self):
         async with self._lock:
-            pos = self._pos
-            self._file_index = 0
-            self._file_pos = 0
-
             # find file on offset
-            while pos >= self.lengths[self._file_index] and self._file_index + 1 < len(self.files):
-                pos -= self.lengths[self._file_index]
-                self._file_index += 1
+            self._file_index, pos = self.locate(self._pos)
 
             # handle last file smaller than pos
-            fpos = await _acall(self.files[self._file_index].seek, pos, io.SEEK_SET)
+            async with self._member_lock(self._file_index):
+                fpos = await self._seek_member(self._file_index, pos)
             if fpos != pos:
                 diff = pos - fpos
                 self._pos -= diff
 
             self._file_pos = fpos
 
+    async def _seek_member(self, index: int, pos: int) -> int:
+        # seeks member only if it's not already on the position
+        if self._member_pos.get(index) != pos:
+            self._member_pos[index] = await _acall((await self._member(index)).seek, pos, io.SEEK_SET)
+            self.member_seeks += 1
+        return self._member_pos[index]
+
+    def _set_pos(self, pos: int):
+        # moves position without seeking, member positions are synced lazily by the next read
+        self._pos = pos
+        self._file_index, self._file_pos = self.locate(pos)
+
+    def _readahead_buffered(self, pos: int) -> bool:
+        return 0 <= pos - self._readahead_offset < len(self._readahead_buf)
+
+    async def _readahead_view(self, amount: int) -> memoryview:
+        # serves cursor reads from the readahead buffer, refills it across members on miss
+        if self._readahead_buffered(self._pos):
+            self.readahead_hits += 1
+        else:
+            self.readahead_misses += 1
+            if self._readahead_buf and self._pos == self._readahead_offset + len(self._readahead_buf):
+                # sequential access
+                self._readahead_window = min(self._readahead_window * 2, self._readahead)
+            else:
+                self._readahead_window = min(READAHEAD_MIN, self._readahead)
+
+            self._readahead_buf = await self.read_at(self._pos, self._readahead_window)
+            self._readahead_offset = self._pos
+
+        view = memoryview(self._readahead_buf)[self._pos - self._readahead_offset:]
+        return view if amount < 0 else view[:amount]
+
+    async def _prefetch_head(self, index: int) -> bytes:
+        try:
+            return bytes(await self._member_read_at(index, 0, min(PREFETCH_SIZE, self.lengths[index])))
+        except asyncio.CancelledError:
+            # member could be left anywhere
+            self._member_pos.pop(index, None)
+            raise
+
+    def _drop_prefetch(self, index: int):
+        task = self._prefetch_tasks.pop(index)
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            # nobody is going to see it
+            task.exception()
+
+    def _cancel_prefetch(self):
+        for index in list(self._prefetch_tasks):
+            self._drop_prefetch(index)
+
+    def _schedule_prefetch(self):
+        # keeps beginnings of the next `prefetch` members in flight, forgets members left behind
+        for index in list(self._prefetch_tasks):
+            if index < self._file_index:
+                self._drop_prefetch(index)
+
+        for index in range(self._file_index + 1, min(self._file_index + 1 + self._prefetch, len(self.files))):
+            if index not in self._prefetch_tasks and self.lengths[index] > 0:
+                self._prefetch_tasks[index] = asyncio.ensure_future(self._prefetch_head(index))
+
+    async def _prefetched(self) -> Optional[bytes]:
+        # beginning of current member if it was prefetched and cursor is still inside of it
+        task = self._prefetch_tasks.get(self._file_index)
+        if task is None:
+            return None
+
+        head = await task
+        if self._file_pos < len(head):
+            return head
+
+        self._drop_prefetch(self._file_index)
+        return None
+
+    def _member_lock(self, index: int) -> asyncio.Lock:
+        lock = self._member_locks.get(index)
+        if lock is None:
+            lock = self._member_locks[index] = asyncio.Lock()
+        return lock
+
+    async def _cached_member_blocks(self, index: int, pos: int, amount: int) -> AsyncIterator[memoryview]:
+        # yields parts of cached member blocks covering `amount` bytes from `pos`
+        end = pos + amount
+        while pos < end:
+            block_no, block_pos = divmod(pos, self._cache_block_size)
+            block = self.cache.get((index, block_no))
+            if block is None:
+                block_start = block_no * self._cache_block_size
+                block_len = max(min(self._cache_block_size, self.lengths[index] - block_start), 0)
+                block = await self._member_read_uncached(index, block_start, block_len)
+                self.cache.put((index, block_no), block)
+
+            chunk = memoryview(block)[block_pos:block_pos + end - pos]
+
+            # detect eof
+            if not chunk:
+                break
+
+            yield chunk
+            pos += len(chunk)
+
+    async def _member_read_at(self, index: int, pos: int, amount: int) -> Union[bytes, memoryview]:
+        # mapped members are returned as views of the mapping
+        view = self._member_map(index)
+        if view is not None:
+            return view[pos:pos + amount]
+
+        if self.cache is not None:
+            return b''.join([chunk async for chunk in self._cached_member_blocks(index, pos, amount)])
+
+        return await self._member_read_uncached(index, pos, amount)
+
+    async def _member_read_uncached(self, index: int, pos: int, amount: int) -> bytes:
+        # short reads are repeated, less than `amount` bytes means the member ended
+        data = await self._member_read_some(index, pos, amount)
+        if len(data) == amount or not data:
+            return data
+
+        chunks = [data]
+        read_len = len(data)
+        while read_len < amount:
+            data = await self._member_read_some(index, pos + read_len, amount - read_len)
+
+            # detect eof
+            if not data:
+                break
+
+            chunks.append(data)
+            read_len += len(data)
+
+        return b''.join(chunks)
+
+    async def _member_read_some(self, index: int, pos: int, amount: int) -> bytes:
+        fileno = self._member_fileno(index)
+        if fileno is not None:
+            # real files are read without touching their position
+            return os.pread(fileno, amount, pos)
+
+        async with self._member_lock(index):
+            f = await self._member(index)
+            if index in self._filenos:
+                # lazy member turned out to be a real file
+                return os.pread(self._filenos[index], amount, pos)
+
+            await self._seek_member(index, pos)
+            data = await _acall(f.read, amount)
+            self._member_pos[index] = pos + len(data)
+            return data
+
+    async def _member_readinto_at(self, index: int, pos: int, buffer: memoryview) -> int:
+        view = self._member_map(index)
+        if view is not None:
+            view = view[pos:pos + len(buffer)]
+            buffer[:len(view)] = view
+            return len(view)
+
+        if self.cache is not None:
+            read_len = 0
+            async for chunk in self._cached_member_blocks(index, pos, len(buffer)):
+                buffer[read_len:read_len + len(chunk)] = chunk
+                read_len += len(chunk)
+            return read_len
+
+        # short reads are repeated, less than `len(buffer)` bytes means the member ended
+        read_len = 0
+        while read_len < len(buffer):
+            chunk_len = await self._member_readinto_some(index, pos + read_len, buffer[read_len:])
+
+            # detect eof
+            if not chunk_len:
+                break
+
+            read_len += chunk_len
+
+        return read_len
+
+    async def _member_readinto_some(self, index: int, pos: int, buffer: memoryview) -> int:
+        fileno = self._member_fileno(index)
+        if fileno is not None:
+            # real files are read without touching their position
+            return preadinto(fileno, buffer, pos)
+
+        async with self._member_lock(index):
+            f = await self._member(index)
+            if index in self._filenos:
+                # lazy member turned out to be a real file
+                return preadinto(self._filenos[index], buffer, pos)
+
+            await self._seek_member(index, pos)
+            if hasattr(f, 'readinto'):
+                # member fills the caller's buffer directly
+                read_len = await _acall(f.readinto, buffer)
+            else:
+                data = await _acall(f.read, len(buffer))
+                read_len = len(data)
+                buffer[:read_len] = data
+            self._member_pos[index] = pos + read_len
+            return read_len
+
+    def _advance(self, read_len: int):
+        # moves position after reading from current member without asking it for the position
+        self._file_pos += read_len
+        self._pos += read_len
+
+        # go to the next member only when current one is exhausted
+        if self._file_pos >= self._file_length and self._file_index + 1 < len(self.files):
+            self._file_index, self._file_pos = self.locate(self._pos)
+
     @property
     def _file(self) -> io.IOBase:
         return self.files[self._file_index]
@@ -125,7 +629,20 @@ class AsyncConcatenatedSeekableFile(AsyncIOBase):
 
     async def close(self):
         async with self._lock:
-            await self._call_on_all_files(lambda f: f.close())
+            tasks = list(self._prefetch_tasks.values())
+            self._cancel_prefetch()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            # mappings of lazy members go away with them
+            for index in [index for index in self._maps if index not in self._open]:
+                munmap(self._maps.pop(index))
+
+            if not isinstance(self.files, ManifestMembers):
+                await asyncio.gather(*(_acall(f.close) for f in self.files if not isinstance(f, LazyMember)))
+            for index in list(self._open):
+                await self._close_member(index)
+            if isinstance(self.files, ManifestMembers):
+                self.files.close()
             self._closed = True
 
     @property
@@ -133,69 +650,426 @@ class AsyncConcatenatedSeekableFile(AsyncIOBase):
         return self._closed
 
     @classmethod
-    async def create(cls, *files: io.IOBase, name: str = '') -> 'AsyncConcatenatedSeekableFile':
-        self = cls(*files, name=name)
+    async def create(cls, *files: io.IOBase, **kwargs) -> 'AsyncConcatenatedSeekableFile':
+        self = cls(*files, **kwargs)
         await self.__aenter__()
         return self
 
+    @classmethod
+    def from_manifest(cls, manifest: Iterable[Tuple[Union[io.IOBase, LazyMember, Opener], int]],
+                      **kwargs) -> 'AsyncConcatenatedSeekableFile':
+        # creates file from (member, length) pairs without probing members for their lengths
+        manifest = list(manifest)
+        return cls(*(f for f, _ in manifest), lengths=[length for _, length in manifest], **kwargs)
+
+    @classmethod
+    def load_manifest(cls, path: str, **kwargs) -> 'AsyncConcatenatedSeekableFile':
+        # creates file from manifest saved by `save_manifest()` in constant time, manifest is memory mapped
+        # and members are opened lazily, failing if they were modified since the manifest was saved
+        offsets, members = read_manifest(path)
+        self = cls(**kwargs)
+        self.files = members
+        self._set_index(OffsetIndex.from_offsets(offsets, self._segment_size))
+        return self
+
+    def save_manifest(self, path: str, stat: bool = True):
+        # saves absolute member paths and lengths (and their mtimes and inodes with `stat`) for `load_manifest()`,
+        # mtimes and inodes are the ones from when lengths were probed
+        names = []
+        for i, f in enumerate(self.files):
+            if isinstance(f, LazyMember) and not callable(f.opener):
+                names.append(os.fsencode(os.path.abspath(f.opener)))
+            elif isinstance(getattr(f, 'name', None), (str, bytes)):
+                names.append(os.fsencode(os.path.abspath(f.name)))
+            else:
+                raise ValueError(f'{f} ({i}) has no path to be saved in manifest.')
+
+        stats = [self._member_stat(i, name) for i, name in enumerate(names)] if stat else None
+        write_manifest(path, names, self._index.offsets, stats)
+
+    def _member_stat(self, index: int, name: bytes) -> Tuple[int, int]:
+        stat = self._stats.get(index)
+        if stat is not None:
+            return stat
+
+        f = self.files[index]
+        if isinstance(f, LazyMember) and f.mtime_ns is not None and f.inode is not None:
+            return f.mtime_ns, f.inode
+
+        # length was given, not probed, at least it has to match
+        stat = os.stat(name)
+        if stat.st_size != self.lengths[index]:
+            raise ValueError(f'{f} ({index}) has length {stat.st_size}, expected {self.lengths[index]}.')
+        return stat.st_mtime_ns, stat.st_ino
+
+    async def getrange(self, start: int, stop: int) -> Union[bytes, memoryview]:
+        # data from `start` up to `stop` without moving or locking the file position,
+        # view of the mapping when all of it is in one mapped member
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        size = max(stop - start, 0)
+        if 0 <= start < len(self):
+            index, pos = self.locate(start)
+            view = self._member_map(index)
+            if view is not None and pos + size <= self.lengths[index]:
+                return view[pos:pos + size]
+
+        return await self.read_at(start, size)
+
+    async def iter_records(self, record_size: int, batch: int = 1024, dtype=None,
+                           offset: int = 0) -> AsyncIterator[Union[bytes, memoryview, 'np.ndarray']]:
+        # yields batches of up to `batch` records of `record_size` bytes from `offset` as contiguous buffers,
+        # or as numpy arrays of `dtype` when it's given, without moving the file position
+        # records split between members are put together, incomplete record at the end is left out
+        dtype = record_dtype(record_size, batch, dtype)
+        end = offset + max(len(self) - offset, 0) // record_size * record_size
+        for start in range(offset, end, batch * record_size):
+            data = await self.getrange(start, min(start + batch * record_size, end))
+            yield data if dtype is None else np.frombuffer(data, dtype)
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        # returns (member index, offset inside of the member) for absolute offset
+        return self._index.locate(offset)
+
+    def locate_many(self, offsets) -> Tuple[Sequence, Sequence]:
+        # returns (member indices, offsets inside of members) arrays for array or buffer of absolute offsets
+        return self._index.locate_many(offsets)
+
     @property
     def name(self) -> str:
         return self._name
 
     async def read(self, amount=-1) -> bytes:
-        if amount < 0 or amount > len(self) - self._pos:
-            amount = len(self) - self._pos
+        async with self._lock:
+            if amount < 0 or amount > len(self) - self._pos:
+                amount = max(len(self) - self._pos, 0)
+
+            if self._concurrency > 1:
+                # joining concurrently read members is the only copy
+                data = b''.join(await self._read_at_concurrently(self._pos, amount))
+                self._set_pos(self._pos + len(data))
+                return data
+
+            # joining member reads is the only copy, single member read is returned as is
+            chunks = []
+            while amount > 0:
+                data = await self.read1(amount)
+
+                # detect eof
+                if data == b'':
+                    break
+
+                chunks.append(data)
+                amount -= len(data)
+
+            return b''.join(chunks)
+
+    async def read_at(self, offset: int, amount: int = -1) -> bytes:
+        # reads from absolute offset without moving or locking the file position
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        chunks = []
+        for index, pos, length in self._index.spans(offset, amount):
+            data = await self._member_read_at(index, pos, length)
+            chunks.append(data)
+
+            # detect eof
+            if len(data) < length:
+                break
+
+        return b''.join(chunks)
+
+    async def read_at_v(self, offset: int, amount: int = -1) -> List[memoryview]:
+        # like `read_at()`, but returns data as it was read from members instead of joining it,
+        # one buffer per member (one per cached block with block cache enabled), parts of mapped members are not copied
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        views = []
+        for index, pos, length in self._index.spans(offset, amount):
+            if self.cache is not None and self._member_map(index) is None:
+                read_len = 0
+                async for chunk in self._cached_member_blocks(index, pos, length):
+                    views.append(chunk)
+                    read_len += len(chunk)
+            else:
+                data = await self._member_read_at(index, pos, length)
+                views.append(memoryview(data))
+                read_len = len(data)
+
+            # detect eof
+            if read_len < length:
+                break
+
+        return views
+
+    async def read_many(self, ranges: Iterable[Tuple[int, int]], gap: int = READ_MANY_GAP,
+                        concurrency: Optional[int] = None) -> List[bytes]:
+        # reads (offset, size) ranges without moving the file position, returns their data in the same order,
+        # ranges less than `gap` bytes apart are coalesced and all member reads are issued at once,
+        # up to `concurrency` of them at the same time when given
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        ranges = list(ranges)
+        for offset, size in ranges:
+            if offset < 0 or size < 0:
+                raise ValueError(f'invalid range ({offset}, {size})')
+
+        # [start, end, indices of ranges] of coalesced ranges
+        merged = []
+        for i in sorted(range(len(ranges)), key=lambda i: ranges[i][0]):
+            offset, size = ranges[i]
+            if merged and offset <= merged[-1][1] + gap:
+                merged[-1][1] = max(merged[-1][1], offset + size)
+                merged[-1][2].append(i)
+            else:
+                merged.append([offset, offset + size, [i]])
+
+        semaphore = asyncio.Semaphore(concurrency) if concurrency else None
 
-        ba = bytearray(amount)
-        await self.readinto(ba)
-        return bytes(ba)
+        async def read_span(index: int, pos: int, buffer: memoryview) -> int:
+            if semaphore is None:
+                return await self._member_readinto_at(index, pos, buffer)
+            async with semaphore:
+                return await self._member_readinto_at(index, pos, buffer)
+
+        buffers = []
+        # (position in `reads`, length) of member reads of every coalesced range
+        spans = []
+        reads = []
+        for start, end, _ in merged:
+            buffer = memoryview(bytearray(max(min(end, len(self)) - start, 0)))
+            buffers.append(buffer)
+
+            # coalesced range is split per member, each one reading into its own part of the buffer
+            range_spans = []
+            buf_pos = 0
+            for index, pos, length in self._index.spans(start, len(buffer)):
+                range_spans.append((len(reads), length))
+                reads.append(read_span(index, pos, buffer[buf_pos:buf_pos + length]))
+                buf_pos += length
+            spans.append(range_spans)
+
+        read_lens = await asyncio.gather(*reads)
+
+        results: List[bytes] = [b''] * len(ranges)
+        for (start, _, indices), buffer, range_spans in zip(merged, buffers, spans):
+            # detect eof, data is valid up to the first short member read
+            data_len = 0
+            for read, length in range_spans:
+                data_len += read_lens[read]
+                if read_lens[read] < length:
+                    break
+
+            for i in indices:
+                offset, size = ranges[i]
+                results[i] = bytes(buffer[offset - start:min(offset + size - start, data_len)])
+
+        return results
 
     async def read1(self, amount=-1) -> bytes:
         if self.closed:
             raise ValueError("I/O operation on closed file.")
-        elif not await self.readable():
+        elif not self._readable:
             raise io.UnsupportedOperation
 
         async with self._lock:
-            fpos = self._file_pos
-            val = await _acall(self._file.read, amount)
+            if self._readahead:
+                val = bytes(await self._readahead_view(amount))
+                self._set_pos(self._pos + len(val))
+                return val
 
-            # check if data not larger than max expected data length and cut
-            max_len = max(self._file_length - fpos, 0)
-            if len(val) > max_len:
-                val = val[:max_len]
+            # never read past expected data length of the member
+            max_len = max(self._file_length - self._file_pos, 0)
+            if amount < 0 or amount > max_len:
+                amount = max_len
 
-            self._file_pos = await _acall(self._file.tell)
-            self._pos += len(val)
+            if self._prefetch:
+                self._schedule_prefetch()
+                head = await self._prefetched()
+                if head is not None:
+                    val = head[self._file_pos:self._file_pos + amount]
+                    self._advance(len(val))
+                    return val
 
-            await self._recalc_file()
+            val = bytes(await self._member_read_at(self._file_index, self._file_pos, amount))
+            self._advance(len(val))
 
             return val
 
+    async def readv(self, amount: int = -1) -> List[memoryview]:
+        # reads from file position like `read()`, returning data as `read_at_v()` does
+        async with self._lock:
+            views = await self.read_at_v(self._pos, amount)
+            self._set_pos(self._pos + sum(map(len, views)))
+            return views
+
     async def readable(self) -> bool:
+        return not self.closed and self._readable
+
+    async def refresh_capabilities(self):
+        # probes members for being readable and seekable, call after swapping members,
+        # everything known about previous members is forgotten
         async with self._lock:
-            return not self.closed and all(await self._call_on_all_files(lambda f: f.readable()))
+            tasks = list(self._prefetch_tasks.values())
+            self._cancel_prefetch()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._readahead_buf = b''
+            if self.cache is not None:
+                self.cache.clear()
+
+            for index in list(self._open):
+                await self._close_member(index)
+            for view in self._maps.values():
+                munmap(view)
+            self._member_pos.clear()
+            self._verified.clear()
+
+            self._filenos = {
+                i: fileno for i, fileno in enumerate(await self._call_on_all_files(_ffileno)) if fileno is not None
+            }
+            self._maps = {}
+            if self._use_mmap:
+                self._maps = {i: fmmap(fileno) for i, fileno in self._filenos.items()}
+                self._maps = {i: view for i, view in self._maps.items() if view is not None}
+
+            self._members_readable = bytes(map(bool, await self._call_on_all_files(lambda f: f.readable())))
+            self._members_seekable = bytes(map(bool, await self._call_on_all_files(lambda f: f.seekable())))
+            self._readable = all(self._members_readable)
+            self._seekable = all(self._members_seekable)
 
     async def readinto(self, buffer) -> int:
         async with self._lock:
-            buf_len = len(buffer)
+            if self._concurrency > 1:
+                data_len = await self.readinto_at(self._pos, buffer)
+                self._set_pos(self._pos + data_len)
+                return data_len
+
+            view = memoryview(buffer).cast('B')
             data_len = 0
-            while data_len < buf_len:
-                data = await self.read1(buf_len - data_len)
+            while data_len < len(view):
+                read_len = await self.readinto1(view[data_len:])
 
                 # detect eof
-                if data == b'':
+                if read_len == 0:
                     break
 
-                buffer[data_len:data_len+len(data)] = data
-                data_len += len(data)
+                data_len += read_len
 
             return data_len
 
+    async def readinto_at(self, offset: int, buffer) -> int:
+        # reads into buffer from absolute offset without moving or locking the file position
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        view = memoryview(buffer).cast('B')
+        if self._concurrency > 1:
+            return await self._readinto_at_concurrently(offset, view)
+
+        data_len = 0
+        for index, pos, length in self._index.spans(offset, len(view)):
+            read_len = await self._member_readinto_at(index, pos, view[data_len:data_len + length])
+            data_len += read_len
+
+            # detect eof
+            if read_len < length:
+                break
+
+        return data_len
+
+    async def _read_at_concurrently(self, offset: int, amount: int) -> List[Union[bytes, memoryview]]:
+        # reads of members spanning `amount` bytes from `offset` issued at once, up to end of file
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def read_span(index: int, pos: int, length: int) -> Union[bytes, memoryview]:
+            async with semaphore:
+                return await self._member_read_at(index, pos, length)
+
+        spans = list(self._index.spans(offset, amount))
+        chunks = await asyncio.gather(*(read_span(*span) for span in spans))
+
+        for i, (chunk, (_, _, length)) in enumerate(zip(chunks, spans)):
+            # detect eof
+            if len(chunk) < length:
+                return chunks[:i + 1]
+
+        return chunks
+
+    async def _readinto_at_concurrently(self, offset: int, view: memoryview) -> int:
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def read_span(index: int, pos: int, start: int, length: int) -> int:
+            async with semaphore:
+                return await self._member_readinto_at(index, pos, view[start:start + length])
+
+        spans = []
+        start = 0
+        for index, pos, length in self._index.spans(offset, len(view)):
+            spans.append((index, pos, start, length))
+            start += length
+
+        # every member writes into its own slice of the buffer
+        read_lens = await asyncio.gather(*(read_span(*span) for span in spans))
+
+        data_len = 0
+        for read_len, (_, _, _, length) in zip(read_lens, spans):
+            data_len += read_len
+
+            # detect eof
+            if read_len < length:
+                break
+
+        return data_len
+
+    async def readinto1(self, buffer) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        async with self._lock:
+            view = memoryview(buffer).cast('B')
+
+            if self._readahead:
+                data = await self._readahead_view(len(view))
+                view[:len(data)] = data
+                self._set_pos(self._pos + len(data))
+                return len(data)
+
+            # never read past expected data length of the member
+            max_len = max(self._file_length - self._file_pos, 0)
+            view = view[:max_len]
+
+            if self._prefetch:
+                self._schedule_prefetch()
+                head = await self._prefetched()
+                if head is not None:
+                    data = memoryview(head)[self._file_pos:self._file_pos + len(view)]
+                    view[:len(data)] = data
+                    self._advance(len(data))
+                    return len(data)
+
+            read_len = await self._member_readinto_at(self._file_index, self._file_pos, view)
+            self._advance(read_len)
+
+            return read_len
+
     async def seek(self, offset, whence=io.SEEK_SET) -> int:
         if self.closed:
             raise ValueError("I/O operation on closed file.")
-        if not await self.seekable():
+        if not self._seekable:
             raise io.UnsupportedOperation
 
         async with self._lock:
@@ -212,13 +1086,22 @@ class AsyncConcatenatedSeekableFile(AsyncIOBase):
 
             self._pos += offset
 
-            await self._recalc_file()
+            if self._prefetch_tasks and self.locate(self._pos)[0] != self._file_index:
+                # prefetched members are not upcoming anymore
+                self._cancel_prefetch()
+
+            if self._readahead:
+                if not self._readahead_buffered(self._pos):
+                    # discontinuous seek, drop buffer and start with smallest window again
+                    self._readahead_buf = b''
+                self._set_pos(self._pos)
+            else:
+                await self._recalc_file()
 
             return self._pos
 
     async def seekable(self) -> bool:
-        async with self._lock:
-            return all(await self._call_on_all_files(lambda f: f.seekable()))
+        return self._seekable
 
     async def tell(self) -> int:
         async with self._lock:
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class BlockCache:
+    # LRU cache of blocks limited by total size of cached data
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._blocks: 'OrderedDict[Hashable, bytes]' = OrderedDict()
+
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def clear(self):
+        self._blocks.clear()
+        self.resident_bytes = 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        block = self._blocks.get(key)
+        if block is None:
+            self.misses += 1
+            return None
+
+        self._blocks.move_to_end(key)
+        self.hits += 1
+        return block
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def put(self, key: Hashable, block: bytes):
+        if len(block) > self.capacity:
+            return
+
+        old = self._blocks.pop(key, None)
+        if old is not None:
+            self.resident_bytes -= len(old)
+
+        self._blocks[key] = block
+        self.resident_bytes += len(block)
+
+        # evict least recently used
+        while self.resident_bytes > self.capacity:
+            _, evicted = self._blocks.popitem(last=False)
+            self.resident_bytes -= len(evicted)
+            self.evictions += 1
@@ -0,0 +1,515 @@
+import io
+import operator
+import os
+from typing import Optional, Tuple, Dict, Iterable, Iterator, Sequence, List, Union
+
+from .NumpyView import NumpyView
+from .OffsetIndex import OffsetIndex
+from .helpers import LINE_CHUNK_SIZE, fmmap, munmap, np, preadinto, record_dtype, strided
+
+# `PyBUF_WRITABLE` flag of buffer requests
+_PYBUF_WRITABLE = 1
+
+
+def _flen(f: io.IOBase) -> Optional[int]:
+    if hasattr(f, '__len__'):
+        # noinspection PyTypeChecker
+        return len(f)
+
+    elif hasattr(f, 'len'):
+        return f.len()
+
+    elif hasattr(f, 'getbuffer'):
+        # BytesIO and similar
+        return len(f.getbuffer())
+
+    elif hasattr(f, 'fileno'):
+        # real files
+        try:
+            fileno = f.fileno()
+        except OSError:
+            pass
+        else:
+            if hasattr(f, 'mode'):
+                if 'b' not in f.mode:
+                    # text mode files are not supported
+                    return None
+            return os.fstat(fileno).st_size
+
+    elif hasattr(f, 'seek') and hasattr(f, 'tell'):
+        # seekable files fallback
+        try:
+            offset = f.tell()
+            length = f.seek(0, io.SEEK_END)
+            f.seek(offset, io.SEEK_SET)
+            return length
+        except OSError:
+            pass
+
+    return None
+
+
+def _ffileno(f: io.IOBase) -> Optional[int]:
+    # descriptor of real binary files, used for positional reads
+    if not hasattr(os, 'pread') or not hasattr(f, 'fileno'):
+        return None
+
+    try:
+        fileno = f.fileno()
+    except OSError:
+        return None
+
+    if hasattr(f, 'mode') and 'b' not in f.mode:
+        return None
+
+    return fileno
+
+
+class ConcatenatedSeekableFile(io.RawIOBase):
+    # synchronous counterpart of `AsyncConcatenatedSeekableFile`, can be wrapped in `io.BufferedReader`
+
+    def __init__(self, *files: io.IOBase, name: str = '', lengths: Optional[Sequence[int]] = None,
+                 segment_size: Optional[int] = None, use_mmap: bool = True):
+        # `lengths` of members skip probing them
+        # `segment_size` declares that every member but the last is that long, it's detected when not given
+        # `use_mmap` maps members that are real files into memory, reads inside of them are not copied
+        super().__init__()
+        self._segment_size = segment_size
+        self._use_mmap = use_mmap
+
+        self._pos = 0
+        self._file_index = 0
+        self._file_pos = 0
+        self._name = name
+
+        # last known position of every touched member, lets sequential reads skip seeking
+        self._member_pos: Dict[int, int] = {}
+        # number of seeks issued on members
+        self.member_seeks = 0
+
+        # members are not owned (and closed) until their lengths are known
+        self.files = ()
+        self._filenos: Tuple[Optional[int], ...] = ()
+        self._maps: Tuple[Optional[memoryview], ...] = ()
+        self._index = None
+        self._length = 0
+
+        if lengths is not None:
+            # trust the caller, members are not probed
+            if len(lengths) != len(files):
+                raise ValueError(f'{len(lengths)} lengths given for {len(files)} files.')
+        else:
+            lengths = tuple(_flen(f) for f in files)
+
+        for i in range(len(lengths)):
+            if lengths[i] is None:
+                raise ValueError(f'{files[i]} ({i}) has unknown length.')
+
+        self.files = files
+        self.lengths = lengths
+
+        self.refresh_capabilities()
+
+    def __buffer__(self, flags: int) -> memoryview:
+        # read-only buffer of whole data (PEP 688, Python 3.12+), copied unless it's in one mapped member
+        if flags & _PYBUF_WRITABLE:
+            raise BufferError(f'{type(self).__name__} is read-only.')
+        return memoryview(self.getrange(0, len(self)))
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[int, bytes, memoryview]:
+        # byte value or data of a slice, see `getrange()`
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self.getrange(start, stop)
+
+            r = range(start, stop, step)
+            if not r:
+                return b''
+            start = min(r[0], r[-1])
+            return strided(self.getrange(start, max(r[0], r[-1]) + 1), start, r)
+
+        key = operator.index(key)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('index out of range')
+        return self.getrange(key, key + 1)[0]
+
+    def __iter__(self) -> Iterator[bytes]:
+        # lines from the file position, read in big chunks and scanned for newlines,
+        # file position follows yielded lines
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._seekable:
+            # positional reads need seekable members
+            return super().__iter__()
+        return self._lines()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _lines(self) -> Iterator[bytes]:
+        # parts of the current line from previous chunks
+        pending = []
+        chunk = b''
+        chunk_pos = 0
+        read_pos = self._pos
+        while True:
+            newline = chunk.find(b'\n', chunk_pos)
+            if newline < 0:
+                if chunk_pos < len(chunk):
+                    pending.append(chunk[chunk_pos:])
+
+                chunk = self.read_at(read_pos, LINE_CHUNK_SIZE)
+                chunk_pos = 0
+                read_pos += len(chunk)
+
+                # detect eof
+                if not chunk:
+                    if pending:
+                        line = b''.join(pending)
+                        self._set_pos(self._pos + len(line))
+                        yield line
+                    return
+                continue
+
+            line = chunk[chunk_pos:newline + 1]
+            if pending:
+                line = b''.join(pending) + line
+                pending = []
+            chunk_pos = newline + 1
+
+            pos = self._pos + len(line)
+            self._set_pos(pos)
+            yield line
+
+            if self._pos != pos:
+                # file position was moved in the meantime, continue from there
+                pending = []
+                chunk = b''
+                chunk_pos = 0
+                read_pos = self._pos
+
+    @property
+    def lengths(self) -> Optional[Sequence[int]]:
+        return self._index.lengths if self._index is not None else None
+
+    @lengths.setter
+    def lengths(self, lengths: Optional[Sequence[int]]):
+        # offset index and total length are rebuilt only when member lengths change
+        self._index = OffsetIndex(lengths, self._segment_size) if lengths is not None else None
+        self._length = len(self._index) if self._index is not None else 0
+
+    def _recalc_file(self):
+        # find file on offset
+        self._file_index, pos = self.locate(self._pos)
+
+        # handle last file smaller than pos
+        fpos = self._seek_member(self._file_index, pos)
+        if fpos != pos:
+            diff = pos - fpos
+            self._pos -= diff
+
+        self._file_pos = fpos
+
+    def _seek_member(self, index: int, pos: int) -> int:
+        # seeks member only if it's not already on the position
+        if self._member_pos.get(index) != pos:
+            self._member_pos[index] = self.files[index].seek(pos, io.SEEK_SET)
+            self.member_seeks += 1
+        return self._member_pos[index]
+
+    def _member_read_at(self, index: int, pos: int, amount: int) -> Union[bytes, memoryview]:
+        # mapped members are returned as views of the mapping
+        view = self._maps[index]
+        if view is not None:
+            return view[pos:pos + amount]
+
+        # short reads are repeated, less than `amount` bytes means the member ended
+        data = self._member_read_some(index, pos, amount)
+        if len(data) == amount or not data:
+            return data
+
+        chunks = [data]
+        read_len = len(data)
+        while read_len < amount:
+            data = self._member_read_some(index, pos + read_len, amount - read_len)
+
+            # detect eof
+            if not data:
+                break
+
+            chunks.append(data)
+            read_len += len(data)
+
+        return b''.join(chunks)
+
+    def _member_read_some(self, index: int, pos: int, amount: int) -> bytes:
+        fileno = self._filenos[index]
+        if fileno is not None:
+            # real files are read without touching their position
+            return os.pread(fileno, amount, pos)
+
+        self._seek_member(index, pos)
+        data = self.files[index].read(amount)
+        self._member_pos[index] = pos + len(data)
+        return data
+
+    def _member_readinto_at(self, index: int, pos: int, buffer: memoryview) -> int:
+        view = self._maps[index]
+        if view is not None:
+            view = view[pos:pos + len(buffer)]
+            buffer[:len(view)] = view
+            return len(view)
+
+        # short reads are repeated, less than `len(buffer)` bytes means the member ended
+        read_len = 0
+        while read_len < len(buffer):
+            chunk_len = self._member_readinto_some(index, pos + read_len, buffer[read_len:])
+
+            # detect eof
+            if not chunk_len:
+                break
+
+            read_len += chunk_len
+
+        return read_len
+
+    def _member_readinto_some(self, index: int, pos: int, buffer: memoryview) -> int:
+        fileno = self._filenos[index]
+        if fileno is not None:
+            # real files are read without touching their position
+            return preadinto(fileno, buffer, pos)
+
+        self._seek_member(index, pos)
+        f = self.files[index]
+        if hasattr(f, 'readinto'):
+            # member fills the caller's buffer directly
+            read_len = f.readinto(buffer)
+        else:
+            data = f.read(len(buffer))
+            read_len = len(data)
+            buffer[:read_len] = data
+        self._member_pos[index] = pos + read_len
+        return read_len
+
+    def _set_pos(self, pos: int):
+        # moves position without seeking, member positions are synced lazily by the next read
+        self._pos = pos
+        self._file_index, self._file_pos = self.locate(pos)
+
+    def _advance(self, read_len: int):
+        # moves position after reading from current member without asking it for the position
+        self._file_pos += read_len
+        self._pos += read_len
+
+        # go to the next member only when current one is exhausted
+        if self._file_pos >= self._file_length and self._file_index + 1 < len(self.files):
+            self._file_index, self._file_pos = self.locate(self._pos)
+
+    @property
+    def _file(self) -> io.IOBase:
+        return self.files[self._file_index]
+
+    @property
+    def _file_length(self) -> int:
+        return self.lengths[self._file_index]
+
+    def as_numpy(self, dtype, offset: int = 0) -> NumpyView:
+        # lazy array of `dtype` elements stored from `offset`, requires numpy
+        return NumpyView(self, dtype, offset)
+
+    def close(self):
+        if not self.closed:
+            for view in self._maps:
+                if view is not None:
+                    munmap(view)
+            self._maps = ()
+            for f in self.files:
+                f.close()
+        super().close()
+
+    @classmethod
+    def from_manifest(cls, manifest: Iterable[Tuple[io.IOBase, int]], **kwargs) -> 'ConcatenatedSeekableFile':
+        # creates file from (member, length) pairs without probing members for their lengths
+        manifest = list(manifest)
+        return cls(*(f for f, _ in manifest), lengths=[length for _, length in manifest], **kwargs)
+
+    def getrange(self, start: int, stop: int) -> Union[bytes, memoryview]:
+        # data from `start` up to `stop` without moving the file position,
+        # view of the mapping when all of it is in one mapped member
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        size = max(stop - start, 0)
+        if 0 <= start < len(self):
+            index, pos = self.locate(start)
+            view = self._maps[index]
+            if view is not None and pos + size <= self.lengths[index]:
+                return view[pos:pos + size]
+
+        return self.read_at(start, size)
+
+    def iter_records(self, record_size: int, batch: int = 1024, dtype=None,
+                     offset: int = 0) -> Iterator[Union[bytes, memoryview, 'np.ndarray']]:
+        # yields batches of up to `batch` records of `record_size` bytes from `offset` as contiguous buffers,
+        # or as numpy arrays of `dtype` when it's given, without moving the file position
+        # records split between members are put together, incomplete record at the end is left out
+        dtype = record_dtype(record_size, batch, dtype)
+        end = offset + max(len(self) - offset, 0) // record_size * record_size
+        for start in range(offset, end, batch * record_size):
+            data = self.getrange(start, min(start + batch * record_size, end))
+            yield data if dtype is None else np.frombuffer(data, dtype)
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        # returns (member index, offset inside of the member) for absolute offset
+        return self._index.locate(offset)
+
+    def locate_many(self, offsets) -> Tuple[Sequence, Sequence]:
+        # returns (member indices, offsets inside of members) arrays for array or buffer of absolute offsets
+        return self._index.locate_many(offsets)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def read_at(self, offset: int, amount: int = -1) -> bytes:
+        # reads from absolute offset without moving the file position
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        chunks = []
+        for index, pos, length in self._index.spans(offset, amount):
+            data = self._member_read_at(index, pos, length)
+            chunks.append(data)
+
+            # detect eof
+            if len(data) < length:
+                break
+
+        return b''.join(chunks)
+
+    def read_at_v(self, offset: int, amount: int = -1) -> List[memoryview]:
+        # like `read_at()`, but returns data as it was read from members instead of joining it, one buffer per member,
+        # parts of mapped members are not copied
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        views = []
+        for index, pos, length in self._index.spans(offset, amount):
+            data = self._member_read_at(index, pos, length)
+            views.append(memoryview(data))
+
+            # detect eof
+            if len(data) < length:
+                break
+
+        return views
+
+    def readv(self, amount: int = -1) -> List[memoryview]:
+        # reads from file position like `read()`, returning data as `read_at_v()` does
+        views = self.read_at_v(self._pos, amount)
+        self._set_pos(self._pos + sum(map(len, views)))
+        return views
+
+    def readable(self) -> bool:
+        return not self.closed and self._readable
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        data_len = 0
+        while data_len < len(view):
+            read_len = self._readinto1(view[data_len:])
+
+            # detect eof
+            if read_len == 0:
+                break
+
+            data_len += read_len
+
+        return data_len
+
+    def readinto_at(self, offset: int, buffer) -> int:
+        # reads into buffer from absolute offset without moving the file position
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        view = memoryview(buffer).cast('B')
+        data_len = 0
+        for index, pos, length in self._index.spans(offset, len(view)):
+            read_len = self._member_readinto_at(index, pos, view[data_len:data_len + length])
+            data_len += read_len
+
+            # detect eof
+            if read_len < length:
+                break
+
+        return data_len
+
+    def _readinto1(self, buffer) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        elif not self._readable:
+            raise io.UnsupportedOperation
+
+        # never read past expected data length of the member
+        max_len = max(self._file_length - self._file_pos, 0)
+
+        read_len = self._member_readinto_at(self._file_index, self._file_pos, buffer[:max_len])
+        self._advance(read_len)
+
+        return read_len
+
+    def refresh_capabilities(self):
+        # probes members for being readable and seekable, call after swapping members,
+        # everything known about previous members is forgotten
+        self._member_pos.clear()
+        for view in self._maps:
+            if view is not None:
+                munmap(view)
+        self._filenos = tuple(_ffileno(f) for f in self.files)
+        self._maps = tuple(
+            fmmap(fileno) if self._use_mmap and fileno is not None else None for fileno in self._filenos
+        )
+
+        # one byte per member
+        self._members_readable = bytes(bool(f.readable()) for f in self.files)
+        self._members_seekable = bytes(bool(f.seekable()) for f in self.files)
+        self._readable = all(self._members_readable)
+        self._seekable = all(self._members_seekable)
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if not self._seekable:
+            raise io.UnsupportedOperation
+
+        # calculate position from start
+        if whence == io.SEEK_SET:
+            self._pos = 0
+        elif whence == io.SEEK_CUR:
+            pass
+        elif whence == io.SEEK_END:
+            self._pos = len(self)
+        else:
+            raise ValueError("whence must be io.SEEK_SET (0), "
+                             "io.SEEK_CUR (1) or io.SEEK_END (2)")
+
+        self._pos += offset
+
+        self._recalc_file()
+
+        return self._pos
+
+    def seekable(self) -> bool:
+        return self._seekable
+
+    def tell(self) -> int:
+        return self._pos
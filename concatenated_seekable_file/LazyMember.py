@@ -0,0 +1,46 @@
+import inspect
+import io
+import os
+from typing import Awaitable, Callable, Optional, Union
+
+Opener = Union[str, os.PathLike, Callable[[], Union[io.IOBase, Awaitable[io.IOBase]]]]
+
+
+class LazyMember:
+    # member opened only when accessed, `opener` is a path opened in binary mode or a callable returning
+    # (possibly awaitable) file object, `length` skips opening the member just to know its size,
+    # `mtime_ns` and `inode` make opening a path fail if it was changed since
+
+    __slots__ = ('opener', 'length', 'mtime_ns', 'inode')
+
+    def __init__(self, opener: Opener, length: Optional[int] = None, mtime_ns: Optional[int] = None,
+                 inode: Optional[int] = None):
+        self.opener = opener
+        self.length = length
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.opener!r}, length={self.length!r})'
+
+    async def open(self) -> io.IOBase:
+        if not callable(self.opener):
+            f = open(self.opener, 'rb')
+            if self.mtime_ns is not None or self.inode is not None:
+                stat = os.fstat(f.fileno())
+                if self.mtime_ns not in (None, stat.st_mtime_ns) or self.inode not in (None, stat.st_ino):
+                    f.close()
+                    raise ValueError(f'{self.opener} changed since it was described.')
+            return f
+
+        f = self.opener()
+        if inspect.isawaitable(f):
+            f = await f
+        return f
+
+    # lazy members are expected to be readable and seekable once opened
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
@@ -0,0 +1,129 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import abc
+from itertools import accumulate
+from typing import Iterable, Optional, Sequence, Tuple
+
+from .LazyMember import LazyMember
+from .helpers import munmap
+
+# Manifest layout, all numbers are little-endian unsigned 64-bit integers:
+#   header           magic, member count `n`, flags
+#   offsets          n + 1 prefix offsets of members
+#   mtimes, inodes   n each, only with FLAG_STAT
+#   name offsets     n + 1 offsets of member paths in names
+#   names            file system encoded member paths
+MAGIC = b'CSFMAN\x00\x01'
+FLAG_STAT = 1
+
+_HEADER = struct.Struct('<8sQQ')
+
+
+def _u64(values: Iterable[int]) -> bytes:
+    a = array('Q', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes()
+
+
+def _u64_table(buffer: memoryview, pos: int, count: int) -> Sequence:
+    view = buffer[pos:pos + count * 8]
+    if len(view) != count * 8:
+        raise ValueError('manifest is truncated.')
+
+    if sys.byteorder == 'little':
+        # zero-copy, pages are faulted in when accessed
+        return view.cast('Q')
+
+    a = array('Q', view)
+    a.byteswap()
+    return a
+
+
+class ManifestMembers(abc.Sequence):
+    # lazy members described by manifest, created on access
+
+    def __init__(self, names: memoryview, name_offsets: Sequence, offsets: Sequence,
+                 mtimes: Optional[Sequence] = None, inodes: Optional[Sequence] = None,
+                 buffer: Optional[memoryview] = None):
+        # `buffer` is the mapped manifest, released by `close()`
+        self._buffer = buffer
+        self._names = names
+        self._name_offsets = name_offsets
+        self._offsets = offsets
+        self._mtimes = mtimes
+        self._inodes = inodes
+
+    def __getitem__(self, index: int) -> LazyMember:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('member index out of range')
+
+        return LazyMember(
+            os.fsdecode(bytes(self._names[self._name_offsets[index]:self._name_offsets[index + 1]])),
+            self._offsets[index + 1] - self._offsets[index],
+            self._mtimes[index] if self._mtimes is not None else None,
+            self._inodes[index] if self._inodes is not None else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def close(self):
+        # unmaps manifest, offsets and members can't be accessed anymore
+        if self._buffer is None:
+            return
+
+        for view in (self._names, self._name_offsets, self._offsets, self._mtimes, self._inodes):
+            if isinstance(view, memoryview):
+                try:
+                    view.release()
+                except BufferError:
+                    # exported, released with the last of its users
+                    pass
+        munmap(self._buffer)
+        self._buffer = None
+
+
+def write_manifest(path: str, names: Sequence[bytes], offsets: Sequence[int],
+                   stats: Optional[Sequence[Tuple[int, int]]] = None):
+    # `stats` are (mtime in nanoseconds, inode) of members
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(names), FLAG_STAT if stats is not None else 0))
+        f.write(_u64(offsets))
+        if stats is not None:
+            f.write(_u64(mtime_ns for mtime_ns, _ in stats))
+            f.write(_u64(inode for _, inode in stats))
+        f.write(_u64(accumulate((0, *map(len, names)))))
+        f.write(b''.join(names))
+
+
+def read_manifest(path: str) -> Tuple[Sequence, ManifestMembers]:
+    # maps manifest into memory, returns offsets table and members without reading them
+    with open(path, 'rb') as f:
+        buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    if len(buffer) < _HEADER.size:
+        raise ValueError(f'{path} is not a manifest.')
+    magic, count, flags = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a manifest.')
+
+    pos = _HEADER.size
+    offsets = _u64_table(buffer, pos, count + 1)
+    pos += (count + 1) * 8
+
+    mtimes = inodes = None
+    if flags & FLAG_STAT:
+        mtimes = _u64_table(buffer, pos, count)
+        inodes = _u64_table(buffer, pos + count * 8, count)
+        pos += count * 16
+
+    name_offsets = _u64_table(buffer, pos, count + 1)
+    pos += (count + 1) * 8
+
+    return offsets, ManifestMembers(buffer[pos:], name_offsets, offsets, mtimes, inodes, buffer)
@@ -0,0 +1,115 @@
+import operator
+from typing import Union
+
+from .helpers import np
+
+# elements of members that aren't mapped closer than that are read together, across members as well
+GATHER_GAP = 4 * 1024
+
+
+class NumpyView:
+    # lazy one-dimensional array of `dtype` elements stored in `file` from `offset`, elements are read on indexing,
+    # members don't have to end on element boundaries
+    # `file` is `ConcatenatedSeekableFile`, parts in mapped members are not copied
+
+    ndim = 1
+
+    def __init__(self, file, dtype, offset: int = 0):
+        if np is None:
+            raise ImportError('numpy is required for array views.')
+
+        self._file = file
+        self.dtype = np.dtype(dtype)
+        self.offset = offset
+        self.shape = (max(len(file) - offset, 0) // self.dtype.itemsize,)
+
+    def __array__(self, dtype=None, copy=None) -> 'np.ndarray':
+        a = self[:]
+        return a if dtype is None else a.astype(dtype, copy=False)
+
+    def __getitem__(self, key) -> Union['np.ndarray', 'np.generic']:
+        if isinstance(key, tuple):
+            # index of the only dimension
+            if len(key) > 1:
+                raise IndexError(f'too many indices for array: array is 1-dimensional, but {len(key)} were indexed')
+            key = key[0] if key else slice(None)
+
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self._read(start, max(stop - start, 0))
+            key = np.arange(start, stop, step)
+
+        elif not isinstance(key, (list, np.ndarray)):
+            index = operator.index(key)
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError('index out of range')
+            return self._read(index, 1)[0]
+
+        key = np.asarray(key)
+        if key.dtype == np.bool_:
+            if key.shape != self.shape:
+                raise IndexError(f'boolean index of shape {key.shape} does not match {self.shape}')
+            key = np.flatnonzero(key)
+        elif key.size == 0:
+            key = key.astype(np.intp)
+        elif key.dtype.kind not in 'iu':
+            raise IndexError('arrays used as indices must be of integer or boolean type')
+
+        if key.dtype.kind == 'i':
+            key = np.where(key < 0, key + len(self), key)
+        if key.size and (key.min() < 0 or key.max() >= len(self)):
+            raise IndexError('index out of range')
+
+        return self._gather(key)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._file!r}, dtype={self.dtype}, offset={self.offset})'
+
+    def _read(self, start: int, count: int) -> 'np.ndarray':
+        # contiguous elements, a view of the mapping when they're all in one mapped member
+        start = self.offset + start * self.dtype.itemsize
+        data = self._file.getrange(start, start + count * self.dtype.itemsize)
+        return np.frombuffer(data, self.dtype, len(data) // self.dtype.itemsize)
+
+    def _gather(self, elements: 'np.ndarray') -> 'np.ndarray':
+        itemsize = self.dtype.itemsize
+        starts = self.offset + elements.ravel().astype(np.int64) * itemsize
+        first, _ = self._file.locate_many(starts)
+        last, _ = self._file.locate_many(starts + (itemsize - 1))
+        mapped = np.fromiter((view is not None for view in self._file._maps), bool, len(self._file._maps))
+        rows = np.empty((starts.size, itemsize), np.uint8)
+
+        # elements split between a mapped member and another one are read on their own, once each
+        split = np.flatnonzero((first != last) & (mapped[first] | mapped[last]))
+        split_starts, inverse = np.unique(starts[split], return_inverse=True)
+        split_rows = np.empty((split_starts.size, itemsize), np.uint8)
+        for i, start in enumerate(split_starts.tolist()):
+            split_rows[i] = np.frombuffer(self._file.read_at(start, itemsize), np.uint8)
+        rows[split] = split_rows[inverse.reshape(-1)]
+
+        # the rest is ordered by offset and gathered from ranges read at once, all elements of a mapped member
+        # come from one view of it, elements of other members close to each other are read together
+        rest = np.flatnonzero((first == last) | ~(mapped[first] | mapped[last]))
+        rest = rest[np.argsort(starts[rest], kind='stable')]
+        rest_starts = starts[rest]
+        in_mapped = mapped[first[rest]]
+        far = np.diff(rest_starts) > itemsize + GATHER_GAP
+        same_mapped = in_mapped[:-1] & in_mapped[1:] & (first[rest][:-1] == first[rest][1:])
+        breaks = ~same_mapped & (in_mapped[:-1] | in_mapped[1:] | far)
+
+        byte_offsets = np.arange(itemsize)
+        for cluster in np.split(np.arange(rest.size), np.flatnonzero(breaks) + 1):
+            if not cluster.size:
+                continue
+            cluster_starts = rest_starts[cluster]
+            lo, hi = int(cluster_starts[0]), int(cluster_starts[-1]) + itemsize
+            buffer = np.frombuffer(self._file.getrange(lo, hi), np.uint8)
+            rows[rest[cluster]] = buffer[(cluster_starts - lo)[:, None] + byte_offsets]
+
+        return rows.view(self.dtype).reshape(elements.shape)
@@ -0,0 +1,138 @@
+import bisect
+from array import array
+from collections.abc import Sequence
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from .helpers import np
+
+
+class _OffsetLengths(Sequence):
+    # member lengths computed from offsets on access
+
+    def __init__(self, offsets: Sequence):
+        self._offsets = offsets
+
+    def __eq__(self, other) -> bool:
+        # equal to lists and other sequences of the same lengths
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, List[int]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('member index out of range')
+        return self._offsets[index + 1] - self._offsets[index]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+class OffsetIndex:
+    # prefix-sum table of member start offsets, `offsets[i]` is where member `i` starts
+    # and `offsets[-1]` is the total length of all members, kept as 8 bytes per member array
+    # when every member but the last has the same `segment_size`, offsets are resolved by division
+
+    def __init__(self, lengths: Iterable[int], segment_size: Optional[int] = None):
+        self.offsets = array('Q', (0,))
+        self.offsets.extend(accumulate(lengths))
+        self.lengths = _OffsetLengths(self.offsets)
+
+        if segment_size is None:
+            segment_size = self._detect_segment_size()
+        elif segment_size and not self._has_segment_size(segment_size):
+            raise ValueError(f'members do not start on multiples of segment size {segment_size}.')
+        self.segment_size = segment_size or None
+
+    def __len__(self) -> int:
+        return self.offsets[-1]
+
+    def _has_segment_size(self, segment_size: int) -> bool:
+        # members but the last start on multiples of `segment_size`
+        if segment_size <= 0:
+            return False
+        members = len(self.lengths)
+        starts = self.offsets[:members]
+        return starts == array(starts.typecode, range(0, members * segment_size, segment_size))
+
+    def _detect_segment_size(self) -> Optional[int]:
+        if len(self.lengths) < 2:
+            return None
+
+        # first member's length is the only candidate
+        segment_size = self.offsets[1]
+        return segment_size if self._has_segment_size(segment_size) else None
+
+    @classmethod
+    def from_offsets(cls, offsets: Sequence, segment_size: Optional[int] = None) -> 'OffsetIndex':
+        # index over already computed offsets (e.g. memory mapped ones) without copying them,
+        # `segment_size` has to be declared as detecting it would need to go through all of them,
+        # it's trusted without checking for the same reason
+        self = cls.__new__(cls)
+        self.offsets = offsets
+        self.lengths = _OffsetLengths(offsets)
+        self.segment_size = segment_size or None
+        return self
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        if offset < 0:
+            raise ValueError(f'negative offset {offset}')
+
+        if self.segment_size is not None:
+            index = min(offset // self.segment_size, len(self.lengths) - 1)
+            return index, offset - index * self.segment_size
+
+        # rightmost member starting at or before offset - skips empty members,
+        # offsets past the end land in the last member
+        index = min(bisect.bisect_right(self.offsets, offset) - 1, len(self.lengths) - 1)
+        return index, offset - self.offsets[index]
+
+    def locate_many(self, offsets) -> Tuple[Sequence, Sequence]:
+        # vectorized `locate()` of many offsets, returns arrays of member indices and offsets inside of members,
+        # `numpy` arrays when it's installed and `array.array`s otherwise
+        if np is None:
+            indices, positions = array('Q'), array('Q')
+            for offset in offsets:
+                index, pos = self.locate(offset)
+                indices.append(index)
+                positions.append(pos)
+            return indices, positions
+
+        offsets = np.asarray(offsets)
+        if offsets.dtype.kind == 'i' and offsets.size and offsets.min() < 0:
+            raise ValueError(f'negative offset {offsets.min()}')
+        offsets = offsets.astype(np.uint64, copy=False)
+        last = len(self.lengths) - 1
+
+        if self.segment_size is not None:
+            # unsigned scalars keep the arithmetic in uint64
+            segment_size = np.uint64(self.segment_size)
+            indices = np.minimum(offsets // segment_size, np.uint64(last))
+            return indices.astype(np.intp), offsets - indices * segment_size
+
+        table = np.frombuffer(self.offsets, dtype=np.uint64)
+        # same as `locate()`, rightmost member starting at or before offset
+        indices = np.minimum(np.searchsorted(table, offsets, side='right') - 1, last)
+        return indices, offsets - table[indices]
+
+    def spans(self, offset: int, size: int = -1) -> Iterator[Tuple[int, int, int]]:
+        # yields (member index, offset inside of the member, length) covering `size` bytes from `offset`
+        end = len(self) if size < 0 else min(offset + size, len(self))
+        if offset >= end:
+            return
+
+        index, pos = self.locate(offset)
+        while offset < end:
+            length = min(self.lengths[index] - pos, end - offset)
+            if length > 0:
+                yield index, pos, length
+                offset += length
+            index += 1
+            pos = 0
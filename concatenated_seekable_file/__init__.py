@@ -1,5 +1,7 @@
 __version__ = '0.1.0'
 
 from .AsyncConcatenatedSeekableFile import AsyncConcatenatedSeekableFile
+from .ConcatenatedSeekableFile import ConcatenatedSeekableFile
+from .LazyMember import LazyMember
 
-__all__ = ['AsyncConcatenatedSeekableFile']
+__all__ = ['AsyncConcatenatedSeekableFile', 'ConcatenatedSeekableFile', 'LazyMember']
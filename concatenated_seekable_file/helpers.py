@@ -0,0 +1,60 @@
+# helpers shared by `ConcatenatedSeekableFile` and `AsyncConcatenatedSeekableFile`
+import mmap
+import os
+from typing import Optional, Union
+
+try:
+    import numpy as np
+except ImportError:
+    # optional, only needed for numpy results
+    np = None
+
+# how much is read at once while iterating over lines
+LINE_CHUNK_SIZE = 1024 * 1024
+
+
+def preadinto(fileno: int, buffer: memoryview, pos: int) -> int:
+    if hasattr(os, 'preadv'):
+        # straight into the buffer, bypassing file object and its buffering
+        return os.preadv(fileno, [buffer], pos)
+
+    data = os.pread(fileno, len(buffer), pos)
+    buffer[:len(data)] = data
+    return len(data)
+
+
+def strided(data: Union[bytes, memoryview], start: int, r: range) -> bytes:
+    # picks bytes of range `r` from `data` read from `start`
+    return bytes(data)[r[0] - start::r.step][:len(r)]
+
+
+def record_dtype(record_size: int, batch: int, dtype=None) -> Optional['np.dtype']:
+    if record_size <= 0 or batch <= 0:
+        raise ValueError('record size and batch have to be positive.')
+    if dtype is None:
+        return None
+
+    if np is None:
+        raise ImportError('numpy is required for records of dtype.')
+    dtype = np.dtype(dtype)
+    if dtype.itemsize != record_size:
+        raise ValueError(f'{dtype} is {dtype.itemsize} bytes long, records are {record_size}.')
+    return dtype
+
+
+def fmmap(fileno: int) -> Optional[memoryview]:
+    # read-only mapping of whole real file, empty and unmappable files are read with `pread` instead
+    try:
+        return memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError):
+        return None
+
+
+def munmap(view: memoryview):
+    m = view.obj
+    try:
+        view.release()
+        m.close()
+    except BufferError:
+        # views handed out are still alive, mapping goes away with the last of them
+        pass
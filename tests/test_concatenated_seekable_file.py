@@ -1,8 +1,17 @@
+import asyncio
 import io
+import mmap
+import os
+import sys
+from array import array
 
 import pytest
 
 from concatenated_seekable_file.AsyncConcatenatedSeekableFile import AsyncConcatenatedSeekableFile
+from concatenated_seekable_file.BlockCache import BlockCache
+from concatenated_seekable_file.ConcatenatedSeekableFile import ConcatenatedSeekableFile
+from concatenated_seekable_file.LazyMember import LazyMember
+from concatenated_seekable_file.OffsetIndex import OffsetIndex
 
 
 @pytest.mark.asyncio
@@ -125,3 +134,1122 @@ async def test_async():
 
         assert await acsf.readline() == b'test KURWA\n'
         assert await acsf.read() == b'kek'
+
+
+@pytest.mark.asyncio
+async def test_locate():
+    in_f = [io.BytesIO(b'test'), io.BytesIO(b''), io.BytesIO(b' KURWA\n'), io.BytesIO(b'kek')]
+
+    async with AsyncConcatenatedSeekableFile(*in_f) as acsf:
+        assert acsf.locate(0) == (0, 0)
+        assert acsf.locate(3) == (0, 3)
+        # empty member is skipped
+        assert acsf.locate(4) == (2, 0)
+        assert acsf.locate(10) == (2, 6)
+        assert acsf.locate(11) == (3, 0)
+        assert acsf.locate(13) == (3, 2)
+        # offsets past the end land in the last member
+        assert acsf.locate(14) == (3, 3)
+        assert acsf.locate(100) == (3, 89)
+
+        with pytest.raises(ValueError):
+            acsf.locate(-1)
+
+        assert await acsf.seek(4) == 4
+        assert acsf._file_index == 2
+        assert await acsf.read() == b' KURWA\nkek'
+
+
+@pytest.mark.asyncio
+async def test_len_cached():
+    in_f = [io.BytesIO(b'test'), io.BytesIO(b' KURWA\n'), io.BytesIO(b'kek')]
+
+    async with AsyncConcatenatedSeekableFile(*in_f) as acsf:
+        assert len(acsf) == 14
+
+        # total length follows member lengths
+        acsf.lengths = (4, 7, 2)
+        assert len(acsf) == 13
+        assert acsf.locate(12) == (2, 1)
+        assert await acsf.read() == b'test KURWA\nke'
+
+
+class _ReadOnly:
+    # file-like without `readinto`
+    def __init__(self, data: bytes):
+        self._f = io.BytesIO(data)
+        self.read = self._f.read
+        self.seek = self._f.seek
+        self.tell = self._f.tell
+        self.readable = self._f.readable
+        self.seekable = self._f.seekable
+        self.close = self._f.close
+
+    def __len__(self):
+        return len(self._f.getbuffer())
+
+
+class _ShortReads(io.BytesIO):
+    # member returning at most 1000 bytes per read, like network streams do
+    def read(self, size=-1):
+        return super().read(1000 if size is None or size < 0 else min(size, 1000))
+
+    def readinto(self, buffer):
+        return super().readinto(memoryview(buffer)[:1000])
+
+
+@pytest.mark.asyncio
+async def test_readinto():
+    in_f = [io.BytesIO(b'test'), _ReadOnly(b' KURWA\n'), io.BytesIO(b'kek')]
+
+    async with AsyncConcatenatedSeekableFile(*in_f) as acsf:
+        ba = bytearray(16)
+        view = memoryview(ba)
+        assert await acsf.readinto(view[2:8]) == 6
+        assert ba[2:8] == b'test K'
+        assert await acsf.readinto1(view[8:]) == 5
+        assert ba[8:13] == b'URWA\n'
+        assert await acsf.readinto1(view[13:]) == 3
+        assert await acsf.readinto1(view[13:]) == 0
+        assert ba == b'\0\0test KURWA\nkek'
+
+        await acsf.seek(0)
+        data = await acsf.read(3)
+        assert type(data) is bytes
+        assert data == b'tes'
+        assert await acsf.read(100) == b't KURWA\nkek'
+        assert await acsf.read() == b''
+
+
+@pytest.mark.asyncio
+async def test_sequential_reads_do_not_seek():
+    in_f = [io.BytesIO(b'test'), io.BytesIO(b' KURWA\n'), io.BytesIO(b'kek')]
+
+    async with AsyncConcatenatedSeekableFile(*in_f) as acsf:
+        # every member is positioned once when entered
+        data = b''
+        while True:
+            chunk = await acsf.read1(2)
+            if not chunk:
+                break
+            data += chunk
+        assert data == b'test KURWA\nkek'
+        assert acsf.member_seeks == 3
+
+        # member already on the position is not sought again
+        await acsf.seek(5)
+        assert acsf.member_seeks == 4
+        assert await acsf.read(2) == b'KU'
+        await acsf.seek(7)
+        assert acsf.member_seeks == 4
+        assert await acsf.read(2) == b'RW'
+        assert acsf.member_seeks == 4
+
+
+@pytest.mark.asyncio
+async def test_capabilities_cached():
+    class WriteOnly(io.BytesIO):
+        def readable(self):
+            return False
+
+    in_f = [io.BytesIO(b'test'), io.BytesIO(b' KURWA\n'), io.BytesIO(b'kek')]
+
+    async with AsyncConcatenatedSeekableFile(*in_f) as acsf:
+        assert await acsf.readable()
+        assert await acsf.seekable()
+
+        # swapped members are not probed until asked to
+        acsf.files = (in_f[0], WriteOnly(b' KURWA\n'), in_f[2])
+        assert await acsf.readable()
+
+        await acsf.refresh_capabilities()
+        assert not await acsf.readable()
+        assert await acsf.seekable()
+        with pytest.raises(io.UnsupportedOperation):
+            await acsf.read1(1)
+
+
+def test_sync():
+    in_f = [io.BytesIO(b'test'), _ReadOnly(b' KURWA\n'), io.BytesIO(b'kek')]
+
+    with ConcatenatedSeekableFile(*in_f) as csf:
+        assert len(csf) == 14
+        assert csf.readable()
+        assert csf.seekable()
+
+        assert csf.read(1) == b't'
+        assert csf.tell() == 1
+
+        # first byte of the second file
+        assert csf.seek(4) == 4
+        assert csf._file_index == 1
+        assert csf._file_pos == in_f[1].tell() == 0
+        assert csf.read(1) == b' '
+
+        # after a last byte in the last file
+        assert csf.seek(-2, io.SEEK_END) == 12
+        assert csf.read(5) == b'ek'
+        assert csf.read(1) == b''
+
+        csf.seek(0)
+        ba = bytearray(10)
+        assert csf.readinto(ba) == 10
+        assert ba == b'test KURWA'
+        assert csf.readinto(ba) == 4
+        assert ba == b'\nkek KURWA'
+
+        csf.seek(3)
+        assert csf.read(5) == b't KUR'
+        assert csf.read() == b'WA\nkek'
+
+        csf.seek(0)
+        assert csf.readlines() == [b'test KURWA\n', b'kek']
+
+    assert csf.closed
+    assert all(f._f.closed if isinstance(f, _ReadOnly) else f.closed for f in in_f)
+
+
+def test_sync_buffered(tmp_path):
+    parts = [b'test', b' KURWA\n', b'', b'kek']
+    paths = []
+    for i, part in enumerate(parts):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(part)
+        paths.append(path)
+
+    csf = ConcatenatedSeekableFile(*(open(path, 'rb') for path in paths))
+    with io.BufferedReader(csf, buffer_size=3) as f:
+        assert f.read() == b''.join(parts)
+        f.seek(2)
+        assert f.readline() == b'st KURWA\n'
+        assert f.read(2) == b'ke'
+        assert list(f) == [b'k']
+    assert csf.closed
+
+
+@pytest.mark.asyncio
+async def test_read_at(tmp_path):
+    path = tmp_path / 'part'
+    path.write_bytes(b' KURWA\n')
+    in_f = [io.BytesIO(b'test'), open(path, 'rb'), io.BytesIO(b''), _ReadOnly(b'kek')]
+    data = b'test KURWA\nkek'
+
+    async with AsyncConcatenatedSeekableFile(*in_f) as acsf:
+        assert 1 in acsf._filenos
+        assert 0 not in acsf._filenos
+
+        await acsf.seek(5)
+
+        # parallel positional reads of every range
+        ranges = [(offset, size) for offset in range(16) for size in (-1, 0, 1, 3, 10)]
+        results = await asyncio.gather(*(acsf.read_at(offset, size) for offset, size in ranges))
+        for (offset, size), result in zip(ranges, results):
+            assert result == (data[offset:] if size < 0 else data[offset:offset + size])
+
+        ba = bytearray(8)
+        assert await acsf.readinto_at(2, ba) == 8
+        assert ba == b'st KURWA'
+        assert await acsf.readinto_at(10, ba) == 4
+        assert ba[:4] == b'\nkek'
+
+        # file position is not moved
+        assert await acsf.tell() == 5
+
+        # real file member is read without moving it from where `seek()` left it
+        assert in_f[1].tell() == 1
+        assert await acsf.read(3) == b'KUR'
+
+
+def test_sync_read_at():
+    in_f = [io.BytesIO(b'test'), _ReadOnly(b' KURWA\n'), io.BytesIO(b'kek')]
+    data = b'test KURWA\nkek'
+
+    with ConcatenatedSeekableFile(*in_f) as csf:
+        csf.seek(5)
+        for offset in range(16):
+            for size in (-1, 0, 1, 3, 10):
+                assert csf.read_at(offset, size) == (data[offset:] if size < 0 else data[offset:offset + size])
+
+        ba = bytearray(8)
+        assert csf.readinto_at(2, ba) == 8
+        assert ba == b'st KURWA'
+
+        assert csf.tell() == 5
+        assert csf.read(3) == b'KUR'
+
+
+class _SlowAsync:
+    # async file-like counting reads in flight
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, data: bytes):
+        self._f = io.BytesIO(data)
+
+    def __len__(self):
+        return len(self._f.getbuffer())
+
+    async def read(self, amount=-1):
+        cls = type(self)
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            cls.in_flight -= 1
+        return self._f.read(amount)
+
+    async def seek(self, offset, whence=io.SEEK_SET):
+        return self._f.seek(offset, whence)
+
+    async def tell(self):
+        return self._f.tell()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    async def close(self):
+        self._f.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads():
+    parts = [bytes([i]) * (i + 1) for i in range(10)]
+    data = b''.join(parts)
+
+    async with AsyncConcatenatedSeekableFile(*map(_SlowAsync, parts), concurrency=4) as acsf:
+        _SlowAsync.max_in_flight = 0
+        ba = bytearray(len(data) + 5)
+        assert await acsf.readinto_at(0, ba) == len(data)
+        assert ba[:len(data)] == data
+        assert _SlowAsync.max_in_flight == 4
+
+        assert await acsf.seek(2) == 2
+        assert await acsf.read(20) == data[2:22]
+        assert await acsf.tell() == 22
+        assert await acsf.read1(2) == data[22:24]
+        assert await acsf.read() == data[24:]
+
+
+@pytest.mark.asyncio
+async def test_readahead():
+    parts = [bytes([i]) * 50000 for i in range(8)]
+    data = b''.join(parts)
+
+    async with AsyncConcatenatedSeekableFile(*map(io.BytesIO, parts), readahead=256 * 1024) as acsf:
+        # window grows while reading sequentially, reads cross members
+        for offset in range(0, 200000, 1000):
+            assert await acsf.read(1000) == data[offset:offset + 1000]
+        # 64 KiB, 128 KiB and 256 KiB refills, reads crossing them are split in two
+        assert acsf.readahead_misses == 3
+        assert acsf.readahead_hits == 199
+        assert acsf._readahead_window == 256 * 1024
+
+        ba = bytearray(100000)
+        assert await acsf.readinto(ba) == 100000
+        assert ba == data[200000:300000]
+        assert acsf.readahead_misses == 3
+        assert acsf.readahead_hits == 200
+
+        # seek inside of the buffer keeps it
+        assert await acsf.seek(250000) == 250000
+        assert await acsf.read(10) == data[250000:250010]
+        assert acsf.readahead_misses == 3
+
+        # discontinuous seek drops buffer and shrinks the window
+        assert await acsf.seek(10) == 10
+        assert await acsf.read1(10) == data[10:20]
+        assert acsf.readahead_misses == 4
+        assert acsf._readahead_window == 64 * 1024
+
+        assert await acsf.seek(-5, io.SEEK_END) == len(data) - 5
+        assert await acsf.read() == data[-5:]
+        assert await acsf.read1() == b''
+
+    in_f = [io.BytesIO(b'test'), io.BytesIO(b' KURWA\n'), io.BytesIO(b'kek')]
+    async with AsyncConcatenatedSeekableFile(*in_f, readahead=4) as acsf:
+        assert await acsf.readline() == b'test KURWA\n'
+        assert await acsf.read() == b'kek'
+        await acsf.seek(0)
+        assert await acsf.readlines() == [b'test KURWA\n', b'kek']
+
+
+@pytest.mark.asyncio
+async def test_prefetch():
+    parts = [bytes([i]) * (i + 1) for i in range(10)]
+    data = b''.join(parts)
+    in_f = list(map(_SlowAsync, parts))
+
+    async with AsyncConcatenatedSeekableFile(*in_f, prefetch=3) as acsf:
+        assert await acsf.read1() == parts[0]
+        # next members are being fetched in background
+        assert sorted(acsf._prefetch_tasks) == [1, 2, 3]
+
+        assert await acsf.read1(1) == parts[1][:1]
+        assert await acsf.read1() == parts[1][1:]
+        assert sorted(acsf._prefetch_tasks) == [1, 2, 3, 4]
+
+        ba = bytearray(4)
+        assert await acsf.readinto1(ba) == 3
+        assert ba[:3] == parts[2]
+        assert sorted(acsf._prefetch_tasks) == [2, 3, 4, 5]
+
+        # seek to other member cancels prefetching
+        tasks = list(acsf._prefetch_tasks.values())
+        assert await acsf.seek(len(data) - 3) == len(data) - 3
+        assert not acsf._prefetch_tasks
+        await asyncio.sleep(0)
+        assert all(task.cancelled() or task.done() for task in tasks)
+
+        assert await acsf.read() == data[-3:]
+
+        await acsf.seek(0)
+        assert await acsf.read() == data
+        assert await acsf.read_at(5, 30) == data[5:35]
+
+    assert not acsf._prefetch_tasks
+
+
+def test_block_cache():
+    cache = BlockCache(10)
+    cache.put('a', b'1234')
+    cache.put('b', b'5678')
+    assert cache.get('a') == b'1234'
+    assert cache.get('c') is None
+
+    # least recently used is evicted
+    cache.put('c', b'90')
+    cache.put('d', b'ab')
+    assert cache.resident_bytes == 8
+    assert cache.evictions == 1
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234'
+
+    # blocks larger than the cache are not kept
+    cache.put('e', b'x' * 11)
+    assert cache.get('e') is None
+    assert len(cache) == 3
+
+    assert cache.hits == 2
+    assert cache.misses == 3
+    assert cache.hit_ratio == 0.4
+
+
+@pytest.mark.asyncio
+async def test_cached_reads():
+    parts = [bytes([i]) * 100000 for i in range(3)]
+    data = b''.join(parts)
+    in_f = list(map(_SlowAsync, parts))
+
+    async with AsyncConcatenatedSeekableFile(*in_f, cache_size=256 * 1024) as acsf:
+        assert await acsf.read_at(99990, 20) == data[99990:100010]
+        assert acsf.cache.misses == 2
+        # tail block of the first member and head block of the second one
+        assert acsf.cache.resident_bytes == (100000 - 65536) + 65536
+
+        # served from cache
+        assert await acsf.read_at(99995, 10) == data[99995:100005]
+        assert await acsf.seek(99980) == 99980
+        assert await acsf.read(30) == data[99980:100010]
+        ba = bytearray(16)
+        await acsf.seek(99992)
+        assert await acsf.readinto(ba) == 16
+        assert ba == data[99992:100008]
+        assert acsf.cache.misses == 2
+        assert acsf.cache.hits == 6
+
+        await acsf.seek(0)
+        assert await acsf.read() == data
+        assert acsf.cache.evictions > 0
+        assert acsf.cache.resident_bytes <= 256 * 1024
+        assert 0 < acsf.cache.hit_ratio < 1
+
+
+@pytest.mark.asyncio
+async def test_lazy_members(tmp_path):
+    parts = [bytes([i]) * (i + 1) for i in range(10)]
+    data = b''.join(parts)
+
+    paths = []
+    for i, part in enumerate(parts[:5]):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(part)
+        paths.append(path)
+
+    opened = []
+
+    def opener(part):
+        def open_part():
+            f = io.BytesIO(part)
+            opened.append(f)
+            return f
+        return open_part
+
+    members = [
+        str(paths[0]), paths[1], LazyMember(paths[2]), LazyMember(str(paths[3]), len(parts[3])), paths[4],
+        LazyMember(opener(parts[5]), len(parts[5])), LazyMember(opener(parts[6])), opener(parts[7]),
+        io.BytesIO(parts[8]), _SlowAsync(parts[9]),
+    ]
+    # opener without length is opened to probe it
+    members[7] = LazyMember(members[7])
+
+    async with AsyncConcatenatedSeekableFile(*members, max_open=2) as acsf:
+        assert list(acsf.lengths) == list(map(len, parts))
+        assert len(opened) == 2
+        assert len(acsf._open) <= 2
+
+        assert await acsf.read() == data
+        assert len(acsf._open) <= 2
+
+        for offset in (40, 0, 20, 50, 3):
+            assert await acsf.read_at(offset, 7) == data[offset:offset + 7]
+            await acsf.seek(offset)
+            assert await acsf.read(7) == data[offset:offset + 7]
+            assert len(acsf._open) <= 2
+
+        # evicted members are closed
+        assert all(f.closed for f in opened if all(f is not h for h in acsf._open.values()))
+
+    assert not acsf._open
+    assert all(f.closed for f in opened)
+
+
+@pytest.mark.asyncio
+async def test_given_lengths():
+    class Unprobable(_ReadOnly):
+        def __len__(self):
+            raise AssertionError('length probed')
+
+    parts = [b'test', b' KURWA\n', b'kek']
+
+    acsf = AsyncConcatenatedSeekableFile.from_manifest((Unprobable(part), len(part)) for part in parts)
+    async with acsf:
+        assert len(acsf) == 14
+        assert await acsf.read() == b'test KURWA\nkek'
+
+    with pytest.raises(ValueError):
+        await AsyncConcatenatedSeekableFile.create(*map(Unprobable, parts), lengths=(4, 7))
+
+    # wrong length is found once the member is touched
+    in_f = list(map(io.BytesIO, parts))
+    async with AsyncConcatenatedSeekableFile(*in_f, lengths=(4, 6, 3), verify_lengths=True) as acsf:
+        assert await acsf.read(4) == b'test'
+        assert await acsf.read_at(10, 3) == b'kek'
+        with pytest.raises(ValueError):
+            await acsf.read1()
+        with pytest.raises(ValueError):
+            await acsf.read_at(5, 1)
+
+    with ConcatenatedSeekableFile.from_manifest((Unprobable(part), len(part)) for part in parts) as csf:
+        assert csf.read() == b'test KURWA\nkek'
+
+
+@pytest.mark.asyncio
+async def test_manifest(tmp_path):
+    parts = [b'test', b' KURWA\n', b'', b'kek']
+    data = b''.join(parts)
+    paths = []
+    for i, part in enumerate(parts):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(part)
+        paths.append(path)
+
+    manifest = tmp_path / 'manifest'
+    async with AsyncConcatenatedSeekableFile(paths[0], open(paths[1], 'rb'), *paths[2:]) as acsf:
+        acsf.save_manifest(manifest)
+
+    acsf = AsyncConcatenatedSeekableFile.load_manifest(manifest, max_open=1)
+    assert len(acsf) == 14
+    assert list(acsf.lengths) == [4, 7, 0, 3]
+    assert acsf.files[1].opener == str(paths[1])
+    assert acsf.locate(11) == (3, 0)
+
+    async with acsf:
+        assert await acsf.read() == data
+        assert await acsf.read_at(3, 5) == data[3:8]
+        assert await acsf.seek(9) == 9
+        assert await acsf.read(3) == data[9:12]
+
+    # modified member is detected
+    paths[3].write_bytes(b'kex')
+    os.utime(paths[3], ns=(0, 0))
+    async with AsyncConcatenatedSeekableFile.load_manifest(manifest) as acsf:
+        assert await acsf.read(4) == b'test'
+        with pytest.raises(ValueError):
+            await acsf.read_at(11, 3)
+
+    # manifest without stats
+    async with AsyncConcatenatedSeekableFile(*paths) as acsf:
+        acsf.save_manifest(manifest, stat=False)
+    async with AsyncConcatenatedSeekableFile.load_manifest(manifest) as acsf:
+        assert await acsf.read() == b'test KURWA\nkex'
+
+    async with AsyncConcatenatedSeekableFile(io.BytesIO(b'test')) as acsf:
+        with pytest.raises(ValueError):
+            acsf.save_manifest(manifest)
+
+    with pytest.raises(ValueError):
+        AsyncConcatenatedSeekableFile.load_manifest(paths[1])
+
+
+@pytest.mark.asyncio
+async def test_manifest_paths_and_stats(tmp_path, monkeypatch):
+    parts = [b'test', b' KURWA\n', b'kek']
+    for i, part in enumerate(parts):
+        (tmp_path / f'part{i}').write_bytes(part)
+    manifest = tmp_path / 'manifest'
+
+    # relative paths are saved as absolute ones
+    monkeypatch.chdir(tmp_path)
+    async with AsyncConcatenatedSeekableFile('part0', open('part1', 'rb'), 'part2') as acsf:
+        acsf.save_manifest(manifest)
+    monkeypatch.chdir(tmp_path.parent)
+    async with AsyncConcatenatedSeekableFile.load_manifest(manifest) as acsf:
+        assert await acsf.read() == b''.join(parts)
+        members = acsf.files
+    # mapped manifest is released
+    assert members._buffer is None
+
+    # members are described as they were when their lengths were probed
+    async with AsyncConcatenatedSeekableFile(*(tmp_path / f'part{i}' for i in range(3))) as acsf:
+        (tmp_path / 'part2').write_bytes(b'kex')
+        os.utime(tmp_path / 'part2', ns=(0, 0))
+        acsf.save_manifest(manifest)
+    async with AsyncConcatenatedSeekableFile.load_manifest(manifest) as acsf:
+        with pytest.raises(ValueError):
+            await acsf.read()
+
+    # given lengths are checked against members when there's nothing probed
+    async with AsyncConcatenatedSeekableFile(tmp_path / 'part0', lengths=[5]) as acsf:
+        with pytest.raises(ValueError):
+            acsf.save_manifest(manifest)
+
+
+def test_compact_index():
+    index = OffsetIndex(range(100000))
+
+    # 8 bytes per member
+    assert index.offsets.itemsize == 8
+    assert len(index.offsets) == 100001
+    assert index.offsets.buffer_info()[1] * index.offsets.itemsize == 800008
+
+    assert len(index.lengths) == 100000
+    assert index.lengths[12345] == 12345
+    assert index.lengths[-1] == 99999
+    assert len(index) == sum(range(100000))
+    assert index.locate(sum(range(12345)) + 7) == (12345, 7)
+
+    assert not hasattr(LazyMember('part', 4), '__dict__')
+
+    # lengths behave like the list they were built from
+    assert index.lengths[3:6] == [3, 4, 5]
+    assert index.lengths[-2:] == [99998, 99999]
+    assert index.lengths[:10:4] == [0, 4, 8]
+    assert OffsetIndex([2, 1]).lengths == [2, 1]
+    assert OffsetIndex([2, 1]).lengths == (2, 1)
+    assert OffsetIndex([2, 1]).lengths != [2, 1, 0]
+    assert OffsetIndex([2, 1]).lengths != 'ab'
+
+
+@pytest.mark.asyncio
+async def test_member_state_bounded(tmp_path):
+    # besides the offsets, nothing is kept for every member of a manifest after reading all of them
+    parts = [bytes([i]) * 3 for i in range(50)]
+    paths = []
+    for i, part in enumerate(parts):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(part)
+        paths.append(str(path))
+
+    manifest = tmp_path / 'manifest'
+    async with AsyncConcatenatedSeekableFile(*paths) as acsf:
+        acsf.save_manifest(str(manifest))
+
+    async with AsyncConcatenatedSeekableFile.load_manifest(str(manifest), max_open=2, verify_lengths=True) as acsf:
+        assert await acsf.read() == b''.join(parts)
+        assert len(acsf._open) <= 2
+        assert len(acsf._filenos) <= 2 and len(acsf._maps) <= 2
+        assert len(acsf._member_pos) <= 2 and len(acsf._verified) <= 2
+        assert len(acsf._member_locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_uniform_segments(tmp_path):
+    parts = [b'test', b' KUR', b'WA\nk', b'ek']
+    data = b''.join(parts)
+
+    assert OffsetIndex([4, 4, 4, 2]).segment_size == 4
+    assert OffsetIndex([4, 4, 4, 9]).segment_size == 4
+    assert OffsetIndex([4, 3, 4, 2]).segment_size is None
+    assert OffsetIndex([4]).segment_size is None
+
+    # declared segment size is checked against member lengths
+    assert OffsetIndex([4, 4, 7], segment_size=4).locate(10) == (2, 2)
+    with pytest.raises(ValueError):
+        OffsetIndex([4, 7, 3], segment_size=4)
+    with pytest.raises(ValueError):
+        ConcatenatedSeekableFile(io.BytesIO(b'test'), io.BytesIO(b' KURWA\n'), segment_size=3)
+
+    async with AsyncConcatenatedSeekableFile(*map(io.BytesIO, parts)) as acsf:
+        assert acsf._index.segment_size == 4
+        assert [acsf.locate(offset) for offset in (0, 3, 4, 13, 14, 20)] == \
+               [(0, 0), (0, 3), (1, 0), (3, 1), (3, 2), (3, 8)]
+        assert await acsf.seek(9) == 9
+        assert acsf._file_index == 2
+        assert await acsf.read() == data[9:]
+        assert await acsf.read_at(3, 7) == data[3:10]
+
+        manifest = tmp_path / 'manifest'
+        for i, part in enumerate(parts):
+            (tmp_path / f'part{i}').write_bytes(part)
+        async with AsyncConcatenatedSeekableFile(*(tmp_path / f'part{i}' for i in range(4))) as files:
+            files.save_manifest(manifest)
+
+    async with AsyncConcatenatedSeekableFile.load_manifest(manifest, segment_size=4) as acsf:
+        assert acsf._index.segment_size == 4
+        assert acsf.locate(13) == (3, 1)
+        assert await acsf.read_at(3, 7) == data[3:10]
+
+    with ConcatenatedSeekableFile(*map(io.BytesIO, parts)) as csf:
+        assert csf._index.segment_size == 4
+        assert csf.seek(13) == 13
+        assert csf.read() == b'k'
+
+
+@pytest.mark.parametrize('lengths', [(4, 0, 7, 3), (4, 4, 4, 2)])
+def test_locate_many(lengths):
+    index = OffsetIndex(lengths)
+    offsets = array('Q', range(20))
+
+    indices, positions = index.locate_many(offsets)
+    assert list(zip(map(int, indices), map(int, positions))) == [index.locate(offset) for offset in offsets]
+
+
+def test_locate_many_numpy():
+    np = pytest.importorskip('numpy')
+
+    for lengths in ((4, 0, 7, 3), (4, 4, 4, 2)):
+        index = OffsetIndex(lengths)
+        offsets = np.arange(20, dtype=np.int64)
+        indices, positions = index.locate_many(offsets)
+        assert isinstance(indices, np.ndarray)
+        assert indices.tolist() == [index.locate(offset)[0] for offset in range(20)]
+        assert positions.tolist() == [index.locate(offset)[1] for offset in range(20)]
+
+        with pytest.raises(ValueError):
+            index.locate_many(np.array([-1]))
+
+
+@pytest.mark.asyncio
+async def test_read_many():
+    parts = [bytes(range(i * 10, i * 10 + 10)) for i in range(10)]
+    data = b''.join(parts)
+    ranges = [(95, 10), (3, 4), (0, 2), (8, 15), (50, 0), (60, 5), (5, 1), (40, 3)]
+
+    async with AsyncConcatenatedSeekableFile(*map(_SlowAsync, parts)) as acsf:
+        await acsf.seek(7)
+        _SlowAsync.max_in_flight = 0
+        seeks = acsf.member_seeks
+
+        results = await acsf.read_many(ranges, gap=2)
+        assert results == [data[offset:offset + size] for offset, size in ranges]
+        # (0, 23) is read from three members, (40, 43), (60, 65) and (95, 100) from one each
+        assert acsf.member_seeks - seeks == 6
+        assert _SlowAsync.max_in_flight == 6
+
+        _SlowAsync.max_in_flight = 0
+        assert await acsf.read_many(ranges, gap=0, concurrency=2) == results
+        assert _SlowAsync.max_in_flight == 2
+
+        assert await acsf.read_many([]) == []
+        with pytest.raises(ValueError):
+            await acsf.read_many([(0, -1)])
+
+        assert await acsf.tell() == 7
+
+
+@pytest.mark.asyncio
+async def test_readv():
+    parts = [b'test', b' KURWA\n', b'', b'kek']
+
+    async with AsyncConcatenatedSeekableFile(*map(io.BytesIO, parts)) as acsf:
+        views = await acsf.read_at_v(2, 10)
+        assert all(isinstance(view, memoryview) for view in views)
+        assert [bytes(view) for view in views] == [b'st', b' KURWA\n', b'k']
+
+        assert await acsf.seek(3) == 3
+        assert [bytes(view) for view in await acsf.readv(3)] == [b't', b' K']
+        assert [bytes(view) for view in await acsf.readv()] == [b'URWA\n', b'kek']
+        assert await acsf.tell() == 14
+        assert await acsf.readv() == []
+
+    async with AsyncConcatenatedSeekableFile(*map(io.BytesIO, parts), cache_size=1024) as acsf:
+        await acsf.read_at(0, 14)
+        views = await acsf.read_at_v(2, 10)
+        assert [bytes(view) for view in views] == [b'st', b' KURWA\n', b'k']
+        # cached blocks are not copied
+        assert views[1].obj is acsf.cache.get((1, 0))
+
+    with ConcatenatedSeekableFile(*map(io.BytesIO, parts)) as csf:
+        assert [bytes(view) for view in csf.read_at_v(2, 10)] == [b'st', b' KURWA\n', b'k']
+        csf.seek(3)
+        assert [bytes(view) for view in csf.readv(3)] == [b't', b' K']
+        assert csf.read() == b'URWA\nkek'
+
+
+@pytest.mark.asyncio
+async def test_mmap_members(tmp_path):
+    parts = [b'test', b' KURWA\n', b'', b'kek']
+    paths = []
+    for i, part in enumerate(parts):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(part)
+        paths.append(path)
+
+    files = [open(path, 'rb') for path in paths]
+    async with AsyncConcatenatedSeekableFile(*files, io.BytesIO(b'!'), cache_size=1024) as acsf:
+        # empty member can't be mapped
+        assert sorted(acsf._maps) == [0, 1, 3]
+
+        views = await acsf.read_at_v(2, 13)
+        assert [bytes(view) for view in views] == [b'st', b' KURWA\n', b'kek', b'!']
+        # views of the mapping, mapped members skip block cache
+        assert isinstance(views[1].obj, mmap.mmap)
+        assert len(acsf.cache) == 1
+
+        assert await acsf.read_at(2, 10) == b'st KURWA\nk'
+        assert await acsf.read() == b'test KURWA\nkek!'
+
+        ba = bytearray(8)
+        assert await acsf.readinto_at(9, ba) == 6
+        assert ba[:6] == b'A\nkek!'
+    assert all(f.closed for f in files)
+    # views handed out outlive the file
+    assert bytes(views[0]) == b'st'
+
+    async with AsyncConcatenatedSeekableFile(*paths) as acsf:
+        assert await acsf.read() == b'test KURWA\nkek'
+        assert sorted(acsf._maps) == [0, 1, 3]
+    assert acsf._maps == {}
+
+    files = [open(path, 'rb') for path in paths]
+    with ConcatenatedSeekableFile(*files) as csf:
+        assert csf._maps[2] is None
+        assert [bytes(view) for view in csf.read_at_v(2, 10)] == [b'st', b' KURWA\n', b'k']
+        assert csf.read_at(2, 10) == b'st KURWA\nk'
+        csf.seek(3)
+        assert csf.read() == b't KURWA\nkek'
+
+    files = [open(path, 'rb') for path in paths]
+    with ConcatenatedSeekableFile(*files, use_mmap=False) as csf:
+        assert csf._maps == (None,) * 4
+        assert csf.read() == b'test KURWA\nkek'
+
+
+@pytest.mark.asyncio
+async def test_getitem(tmp_path):
+    parts = [b'test', b' KURWA\n', b'', b'kek']
+    paths = []
+    for i, part in enumerate(parts):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(part)
+        paths.append(path)
+    data = b''.join(parts)
+
+    files = [open(path, 'rb') for path in paths[:2]] + [io.BytesIO(part) for part in parts[2:]]
+    async with AsyncConcatenatedSeekableFile(*files) as acsf:
+        await acsf.seek(3)
+
+        for key in (slice(None), slice(2, 10), slice(-5, None), slice(None, None, -1), slice(1, 13, 3),
+                    slice(12, 2, -2), slice(20, 30), slice(5, 2)):
+            assert bytes(await acsf[key]) == data[key]
+
+        assert await acsf[0] == data[0]
+        assert await acsf[-1] == data[-1]
+        with pytest.raises(IndexError):
+            await acsf[len(data)]
+
+        # inside of one mapped member
+        view = await acsf[5:10]
+        assert isinstance(view, memoryview) and view == b'KURWA'
+        assert await acsf.getrange(11, 13) == b'ke'
+        # position is left as it was
+        assert await acsf.tell() == 3
+
+    files = [open(path, 'rb') for path in paths[:2]] + [io.BytesIO(part) for part in parts[2:]]
+    with ConcatenatedSeekableFile(*files) as csf:
+        for key in (slice(None), slice(2, 10), slice(-5, None), slice(None, None, -1), slice(1, 13, 3)):
+            assert bytes(csf[key]) == data[key]
+        assert csf[-1] == data[-1]
+        assert isinstance(csf[5:10], memoryview)
+        assert csf.getrange(3, 6) == b't K'
+
+        assert bytes(csf.__buffer__(0)) == data
+        with pytest.raises(BufferError):
+            csf.__buffer__(1)
+
+    with ConcatenatedSeekableFile(open(paths[1], 'rb')) as csf:
+        assert csf.__buffer__(0).obj is csf._maps[0].obj
+        if sys.version_info >= (3, 12):
+            assert bytes(memoryview(csf)) == parts[1]
+
+
+def test_as_numpy(tmp_path):
+    np = pytest.importorskip('numpy')
+
+    samples = np.arange(1000, dtype='<i4') * 7 - 3000
+    data = samples.tobytes()
+    # members end in the middle of elements, one member isn't mapped
+    cuts = [0, 6, 6, 1001, 2050, 3999, len(data)]
+    files = []
+    for i, (start, end) in enumerate(zip(cuts, cuts[1:])):
+        if i == 4:
+            files.append(io.BytesIO(data[start:end]))
+            continue
+        path = tmp_path / f'part{i}'
+        path.write_bytes(data[start:end])
+        files.append(open(path, 'rb'))
+
+    with ConcatenatedSeekableFile(*files) as csf:
+        a = csf.as_numpy('<i4')
+        assert len(a) == a.shape[0] == 1000
+        assert np.array_equal(np.asarray(a), samples)
+
+        assert a[1] == samples[1]
+        assert a[-1] == samples[-1]
+        with pytest.raises(IndexError):
+            a[1000]
+
+        for key in (slice(0, 2), slice(300, 700), slice(None, None, 3), slice(999, 0, -7), slice(5, 5)):
+            assert np.array_equal(a[key], samples[key])
+
+        indices = np.array([[0, 1, 250], [251, 512, -1]])
+        assert np.array_equal(a[indices], samples[indices])
+        assert np.array_equal(a[[999, 3, 3]], samples[[999, 3, 3]])
+        mask = samples % 3 == 0
+        assert np.array_equal(a[mask], samples[mask])
+        assert a[[]].shape == (0,)
+        # repeated elements split between members
+        assert np.array_equal(a[[250, 3, 250, 512, 250]], samples[[250, 3, 250, 512, 250]])
+        assert a[(3,)] == samples[3] and np.ndim(a[(3,)]) == 0
+        assert np.array_equal(a[(np.array([1, 2]),)], samples[[1, 2]])
+        with pytest.raises(IndexError):
+            a[1, 2]
+
+        # inside of one mapped member
+        assert not a[260:300].flags.owndata
+
+        # elements split between members that aren't mapped
+        with ConcatenatedSeekableFile(*(io.BytesIO(data[i:i + 7]) for i in range(0, len(data), 7))) as unmapped:
+            indices = np.array([999, 0, 1, 500, 1, 333, 2])
+            assert np.array_equal(unmapped.as_numpy('<i4')[indices], samples[indices])
+
+        b = csf.as_numpy('<u2', offset=2)
+        assert len(b) == 1999
+        assert np.array_equal(b[::5], np.frombuffer(data[2:], '<u2')[::5])
+
+
+@pytest.mark.asyncio
+async def test_iter_records(tmp_path):
+    records = [bytes([i]) * 5 for i in range(11)]
+    data = b''.join(records) + b'xy'
+    # records are split between members, one member isn't mapped
+    cuts = [0, 3, 3, 12, 33, 40, len(data)]
+    paths = []
+    for i, (start, end) in enumerate(zip(cuts, cuts[1:])):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(data[start:end])
+        paths.append(path)
+
+    def members():
+        return [open(path, 'rb') if i != 3 else io.BytesIO(path.read_bytes()) for i, path in enumerate(paths)]
+
+    async with AsyncConcatenatedSeekableFile(*members()) as acsf:
+        batches = [bytes(b) async for b in acsf.iter_records(5, batch=4)]
+        # incomplete record at the end is left out
+        assert batches == [b''.join(records[:4]), b''.join(records[4:8]), b''.join(records[8:])]
+        assert [bytes(b) async for b in acsf.iter_records(5, batch=100, offset=50)] == [records[10]]
+        assert await acsf.tell() == 0
+
+    with ConcatenatedSeekableFile(*members()) as csf:
+        assert [bytes(b) for b in csf.iter_records(5, batch=4)] == batches
+        assert [bytes(b) for b in csf.iter_records(5, offset=53)] == []
+        with pytest.raises(ValueError):
+            next(csf.iter_records(0))
+
+    np = pytest.importorskip('numpy')
+    dtype = np.dtype([('kind', 'u1'), ('value', '<u4')])
+    with ConcatenatedSeekableFile(*members()) as csf:
+        batches = list(csf.iter_records(5, batch=3, dtype=dtype))
+        assert [len(b) for b in batches] == [3, 3, 3, 2]
+        assert list(np.concatenate(batches)['kind']) == list(range(11))
+        with pytest.raises(ValueError):
+            next(csf.iter_records(4, dtype=dtype))
+
+    async with AsyncConcatenatedSeekableFile(*members()) as acsf:
+        batches = [b async for b in acsf.iter_records(5, batch=3, dtype=dtype)]
+        assert list(np.concatenate(batches)['value']) == [int.from_bytes(bytes([i]) * 4, 'little') for i in range(11)]
+
+
+@pytest.mark.asyncio
+async def test_lines(monkeypatch):
+    # small chunks make lines span chunks as well as members
+    monkeypatch.setattr(sys.modules[ConcatenatedSeekableFile.__module__], 'LINE_CHUNK_SIZE', 4)
+    monkeypatch.setattr(sys.modules[AsyncConcatenatedSeekableFile.__module__], 'LINE_CHUNK_SIZE', 4)
+
+    parts = [b'first li', b'ne\nsec', b'', b'ond\n\nvery long last line without newline']
+    lines = [b'first line\n', b'second\n', b'\n', b'very long last line without newline']
+
+    async with AsyncConcatenatedSeekableFile(*map(io.BytesIO, parts)) as acsf:
+        assert [line async for line in acsf] == lines
+        assert await acsf.tell() == len(b''.join(parts))
+
+        # every byte is read once
+        read_at = acsf.read_at
+        reads = []
+
+        async def counting_read_at(offset, amount=-1):
+            data = await read_at(offset, amount)
+            reads.append((offset, len(data)))
+            return data
+
+        acsf.read_at = counting_read_at
+        await acsf.seek(0)
+        assert [line async for line in acsf] == lines
+        assert sum(length for _, length in reads) == len(b''.join(parts))
+
+        # position follows yielded lines, seeking while iterating continues from there
+        await acsf.seek(3)
+        it = acsf.__aiter__()
+        assert await it.__anext__() == b'st line\n'
+        assert await acsf.tell() == 11
+        assert await acsf.read(3) == b'sec'
+        assert await it.__anext__() == b'ond\n'
+        await acsf.seek(0)
+        assert await it.__anext__() == b'first line\n'
+
+    with ConcatenatedSeekableFile(*map(io.BytesIO, parts)) as csf:
+        assert list(csf) == lines
+        csf.seek(5)
+        it = iter(csf)
+        assert next(it) == b' line\n'
+        assert csf.read(6) == b'second'
+        assert list(it) == [b'\n', b'\n', lines[-1]]
+        assert csf.tell() == len(b''.join(parts))
+
+
+@pytest.mark.asyncio
+async def test_cached_short_reads():
+    parts = [bytes(range(256)) * 1000, b'0123456789']
+
+    async with AsyncConcatenatedSeekableFile(*map(_ShortReads, parts), cache_size=1 << 20) as acsf:
+        # blocks are filled by repeated reads, short read is not end of member
+        assert await acsf.read() == b''.join(parts)
+        assert await acsf.read_at(65000, 2000) == b''.join(parts)[65000:67000]
+        assert all(len(acsf.cache.get((0, i))) == 65536 for i in range(3))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_short_reads():
+    parts = [bytes(range(256)) * 100, b'0123456789']
+    data = b''.join(parts)
+
+    async with AsyncConcatenatedSeekableFile(*map(_ShortReads, parts), concurrency=2) as acsf:
+        # short member reads are refilled, not taken for end of file
+        assert await acsf.read() == data
+        assert await acsf.tell() == len(data)
+
+        await acsf.seek(100)
+        ba = bytearray(len(data))
+        assert await acsf.readinto(ba) == len(data) - 100
+        assert ba[:len(data) - 100] == data[100:]
+
+        # read within one member and the rest of the file
+        await acsf.seek(0)
+        assert await acsf.read(5000) == data[:5000]
+        assert await acsf.read() == data[5000:]
+
+
+@pytest.mark.asyncio
+async def test_read_at_short_reads():
+    parts = [bytes(range(256)) * 20, b'0123456789', bytes(range(256)) * 10]
+    data = b''.join(parts)
+
+    async with AsyncConcatenatedSeekableFile(*map(_ShortReads, parts)) as acsf:
+        # short member read is not end of file
+        assert await acsf.read_at(0, 6000) == data[:6000]
+        assert await acsf.read_at(100) == data[100:]
+        assert b''.join(await acsf.read_at_v(0)) == data
+        assert await acsf.read_many([(0, 3000), (5000, 200), (7000, 1000)]) == \
+            [data[:3000], data[5000:5200], data[7000:8000]]
+        assert b''.join([bytes(b) async for b in acsf.iter_records(8, batch=300)]) == data[:len(data) // 8 * 8]
+
+    async with AsyncConcatenatedSeekableFile(*map(_ShortReads, parts), readahead=1 << 20) as acsf:
+        assert await acsf.read() == data
+
+    with ConcatenatedSeekableFile(*map(_ShortReads, parts)) as csf:
+        assert csf.read_at(0, 6000) == data[:6000]
+        ba = bytearray(len(data))
+        assert csf.readinto_at(0, ba) == len(data)
+        assert ba == data
+        assert b''.join(bytes(b) for b in csf.iter_records(8, batch=300)) == data[:len(data) // 8 * 8]
+        assert csf.read() == data
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('use_mmap', [True, False])
+async def test_swap_members(tmp_path, use_mmap):
+    paths = []
+    for i, part in enumerate([b'abcd', b'WXYZ', b'bbb']):
+        path = tmp_path / f'part{i}'
+        path.write_bytes(part)
+        paths.append(path)
+
+    for member in (lambda: io.BytesIO(b'WXYZ'), lambda: open(paths[1], 'rb')):
+        files = [open(paths[0], 'rb'), io.BytesIO(b'bbb')]
+        async with AsyncConcatenatedSeekableFile(*files, cache_size=1024, use_mmap=use_mmap) as acsf:
+            assert await acsf.read() == b'abcdbbb'
+
+            files[0].close()
+            acsf.files = (member(),) + acsf.files[1:]
+            await acsf.refresh_capabilities()
+            # positions, descriptors, mappings and cached blocks of the old member are forgotten
+            assert await acsf.seek(2) == 2
+            assert await acsf.read() == b'YZbbb'
+            assert await acsf.read_at(0, 3) == b'WXY'
+
+        files = [open(paths[0], 'rb'), io.BytesIO(b'bbb')]
+        with ConcatenatedSeekableFile(*files, use_mmap=use_mmap) as csf:
+            assert csf.read() == b'abcdbbb'
+
+            files[0].close()
+            csf.files = (member(),) + csf.files[1:]
+            csf.refresh_capabilities()
+            assert csf.seek(2) == 2
+            assert csf.read() == b'YZbbb'
+            assert csf.read_at(0, 3) == b'WXY'
+
+
+@pytest.mark.asyncio
+async def test_small_cache():
+    class Counting(io.BytesIO):
+        read_bytes = 0
+
+        def read(self, size=-1):
+            data = super().read(size)
+            self.read_bytes += len(data)
+            return data
+
+    data = bytes(range(256)) * 4096
+    member = Counting(data)
+
+    # cache smaller than a block still caches
+    async with AsyncConcatenatedSeekableFile(member, cache_size=32 * 1024) as acsf:
+        for _ in range(100):
+            assert await acsf.read_at(1000, 100) == data[1000:1100]
+        assert member.read_bytes == 32 * 1024
+        assert acsf.cache.hits == 99
+        assert acsf.cache.resident_bytes == 32 * 1024